@@ -15,21 +15,35 @@ Tools demonstrated:
 """
 
 import argparse
-import json
+import heapq
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter, itemgetter
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import (
+    McpSocketClient,
+    McpStdioClient,
+    ParseResult,
+    ProfileResult,
+    ResultCache,
+    ValidateResult,
+    docker_exec_command,
+    preview_lines,
+)
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Test all 9 ANTLR4 MCP Server tools")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
     p.add_argument("--jar-path", default="")
     p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
+    p.add_argument("--socket", default="", help="Connect to a running mcp_daemon.py instead of starting a server")
     p.add_argument("--verbose", "-v", action="store_true", help="Show full responses")
+    p.add_argument("--no-cache", action="store_true", help="Always ask the server instead of reusing cached results")
+    p.add_argument("--refresh", action="store_true", help="Recompute cached results and store the fresh ones")
     return p.parse_args()
 
 
@@ -72,6 +86,11 @@ if (x > 0) {
 """
 
 
+def pluck(result: dict, **defaults) -> tuple:
+    """Fetch several fields of a tool result at once, in the order given."""
+    return itemgetter(*defaults)({**defaults, **result})
+
+
 def print_section(title: str):
     print(f"\n{'='*60}")
     print(f"  {title}")
@@ -81,8 +100,12 @@ def print_section(title: str):
 def main() -> int:
     args = parse_args()
     
-    if args.server == "docker":
+    if args.socket:
+        cmd = []  # the daemon already runs the server; never touch docker
+    elif args.server == "docker":
         cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
     elif args.server == "jar":
         repo_root = Path(args.repo_root).resolve()
         jar_path = args.jar_path.strip()
@@ -95,39 +118,66 @@ def main() -> int:
     print("="*60)
     print("  ANTLR4 MCP Server - All 9 Tools Demo")
     print("="*60)
-    print(f"Server: {' '.join(cmd[:3])}...")
-
-    client = McpStdioClient.start(cmd)
+    if args.socket:
+        print(f"Server: unix:{args.socket}")
+        client = McpSocketClient.connect(args.socket)
+    else:
+        print(f"Server: {' '.join(cmd[:3])}...")
+        client = McpStdioClient.start(cmd)
+    if not args.no_cache:
+        # Each server (image, jar or daemon) keeps its own cached results
+        server = f"unix:{args.socket}" if args.socket else jar_path if args.server == "jar" else args.image
+        client.cache = ResultCache(refresh=args.refresh, server=server)
     results = {}
     
     try:
         client.initialize()
         
         # List tools
-        tools_resp = client.request("tools/list")
-        tools = tools_resp.get("result", {}).get("tools", [])
+        tools = client.list_tools()
         print(f"\n✓ Connected to MCP server")
         print(f"✓ {len(tools)} tools available:")
         for t in tools:
             print(f"    - {t.get('name')}")
 
+        # Register the demo grammar once; later calls reference it by key
+        grammar = client.register_grammar(DEMO_GRAMMAR)
+
+        # Start the analyses that only need the grammar up front; each section
+        # below waits on its own result, so the server can overlap the work
+        prefetched = {
+            "validate_grammar": client.call_tool_async("validate_grammar", {
+                **client.grammar_args(grammar),
+                "grammar_name": "Expression"
+            }, ValidateResult),
+            "analyze_left_recursion": client.call_tool_async("analyze_left_recursion", {
+                **client.grammar_args(grammar)
+            }),
+            "analyze_first_follow": client.call_tool_async("analyze_first_follow", {
+                **client.grammar_args(grammar),
+                "rule_name": "expr"
+            }),
+            "visualize_atn": client.call_tool_async("visualize_atn", {
+                **client.grammar_args(grammar),
+                "rule_name": "expr",
+                "format": "all"
+            }),
+        }
+
         # ============================================================
         # TOOL 1: validate_grammar
         # ============================================================
         print_section("Tool 1: validate_grammar")
         print("Validates ANTLR4 grammar syntax and reports errors.\n")
         
-        result = client.call_tool("validate_grammar", {
-            "grammar_text": DEMO_GRAMMAR,
-            "grammar_name": "Expression"
-        })
+        result = prefetched["validate_grammar"].result()
         results["validate_grammar"] = result
         
-        print(f"  Grammar Name: {result.get('grammarName')}")
-        print(f"  Success: {result.get('success')}")
-        print(f"  Rule Count: {result.get('ruleCount', 'N/A')}")
-        if result.get('rules'):
-            print(f"  Rules: {', '.join(result.get('rules', []))}")
+        print(f"  Grammar Name: {result.grammarName}")
+        print(f"  Success: {result.success}")
+        print(f"  Rule Count: {result.ruleCount}")
+        if result.rules:
+            print(f"  Rules: {', '.join(result.rules)}")
         
         # ============================================================
         # TOOL 2: parse_sample
@@ -136,19 +186,20 @@ def main() -> int:
         print("Parses sample input using the grammar.\n")
         
         result = client.call_tool("parse_sample", {
-            "grammar_text": DEMO_GRAMMAR,
+            **client.grammar_args(grammar),
             "sample_input": "x = 1 + 2 * 3;",
             "start_rule": "stat",
-            "show_tokens": True
-        })
+            # Token lists are only printed with --verbose; skip shipping them otherwise
+            "show_tokens": args.verbose
+        }, ParseResult)
         results["parse_sample"] = result
         
-        print(f"  Success: {result.get('success')}")
-        print(f"  Parse Tree: {result.get('parseTree', 'N/A')[:100]}...")
-        if result.get('tokens'):
-            print(f"  Token Count: {len(result.get('tokens', []))}")
+        print(f"  Success: {result.success}")
+        print(f"  Parse Tree: {(result.parseTree or 'N/A')[:100]}...")
+        if result.tokens:
+            print(f"  Token Count: {len(result.tokens)}")
             if args.verbose:
-                for tok in result.get('tokens', [])[:5]:
+                for tok in result.tokens[:5]:
                     print(f"    {tok}")
         
         # ============================================================
@@ -157,14 +208,20 @@ def main() -> int:
         print_section("Tool 3: compile_grammar_multi_target")
         print("Generates parser code for target languages.\n")
         
-        for target in ["java", "python", "javascript"]:
-            result = client.call_tool("compile_grammar_multi_target", {
-                "grammar_text": DEMO_GRAMMAR,
-                "target_language": target,
-                "generate_listener": True,
-                "generate_visitor": True,
-                "include_generated_code": False
-            })
+        # Targets are independent, so compile them concurrently over one connection
+        targets = ["java", "python", "javascript"]
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            compiled = list(executor.map(
+                lambda target: client.call_tool("compile_grammar_multi_target", {
+                    **client.grammar_args(grammar),
+                    "target_language": target,
+                    "generate_listener": True,
+                    "generate_visitor": True,
+                    "include_generated_code": False
+                }),
+                targets,
+            ))
+        for target, result in zip(targets, compiled):
             file_count = result.get('fileCount', 0)
             print(f"  {target.capitalize():12} → {file_count} files generated")
         
@@ -176,30 +233,28 @@ def main() -> int:
         print_section("Tool 4: detect_ambiguity")
         print("Analyzes grammar for potential ambiguities.\n")
         
-        result = client.call_tool("detect_ambiguity", {
-            "grammar_text": DEMO_GRAMMAR
-        })
-        results["detect_ambiguity"] = result
-        
-        print(f"  Has Ambiguities: {result.get('hasAmbiguities', False)}")
-        if result.get('ambiguities'):
-            print(f"  Ambiguity Count: {len(result.get('ambiguities', []))}")
-            for amb in result.get('ambiguities', [])[:3]:
-                print(f"    - {amb.get('description', amb)[:60]}...")
-        else:
-            print("  No structural ambiguities detected")
-            
-        # Test with an ambiguous grammar
+        # Test the demo grammar and a deliberately ambiguous one as pipelined calls
         ambiguous_grammar = """
 grammar Ambig;
 stat: expr ';' | ID '(' ')' ';' ;
 expr: ID | ID '(' ')' ;
 ID: [a-z]+ ;
 """
-        result2 = client.call_tool("detect_ambiguity", {
-            "grammar_text": ambiguous_grammar,
-            "sample_inputs": ["foo();"]
-        })
+        result, result2 = client.call_tools([
+            ("detect_ambiguity", {**client.grammar_args(grammar)}),
+            ("detect_ambiguity", {"grammar_text": ambiguous_grammar, "sample_inputs": ["foo();"]}),
+        ])
+        results["detect_ambiguity"] = result
+        
+        has_ambiguities, ambiguities = pluck(result, hasAmbiguities=False, ambiguities=None)
+        print(f"  Has Ambiguities: {has_ambiguities}")
+        if ambiguities:
+            print(f"  Ambiguity Count: {len(ambiguities)}")
+            for amb in ambiguities[:3]:
+                print(f"    - {amb.get('description', amb)[:60]}...")
+        else:
+            print("  No structural ambiguities detected")
+            
         print(f"\n  Testing ambiguous grammar:")
         print(f"  Has Ambiguities: {result2.get('hasAmbiguities', False)}")
         
@@ -209,21 +264,27 @@ ID: [a-z]+ ;
         print_section("Tool 5: analyze_left_recursion")
         print("Detects and analyzes left recursion patterns.\n")
         
-        result = client.call_tool("analyze_left_recursion", {
-            "grammar_text": DEMO_GRAMMAR
-        })
+        result = prefetched["analyze_left_recursion"].result()
         results["analyze_left_recursion"] = result
         
-        print(f"  Has Left Recursion: {result.get('hasLeftRecursion', False)}")
-        print(f"  Has Direct Left Recursion: {result.get('hasDirectLeftRecursion', False)}")
-        print(f"  Has Indirect Left Recursion: {result.get('hasIndirectLeftRecursion', False)}")
-        
-        if result.get('leftRecursiveRules'):
-            print(f"  Left Recursive Rules: {result.get('leftRecursiveRules')}")
-        
-        if result.get('analysis'):
+        has_lr, has_direct, has_indirect, lr_rules, analysis = pluck(
+            result,
+            hasLeftRecursion=False,
+            hasDirectLeftRecursion=False,
+            hasIndirectLeftRecursion=False,
+            leftRecursiveRules=None,
+            analysis=None,
+        )
+        print(f"  Has Left Recursion: {has_lr}")
+        print(f"  Has Direct Left Recursion: {has_direct}")
+        print(f"  Has Indirect Left Recursion: {has_indirect}")
+        
+        if lr_rules:
+            print(f"  Left Recursive Rules: {lr_rules}")
+        
+        if analysis:
             print("\n  Rule Analysis:")
-            for rule, info in list(result.get('analysis', {}).items())[:3]:
+            for rule, info in list(analysis.items())[:3]:
                 lr_type = info.get('leftRecursionType', 'none')
                 print(f"    {rule}: {lr_type}")
         
@@ -233,24 +294,28 @@ ID: [a-z]+ ;
         print_section("Tool 6: analyze_first_follow")
         print("Computes FIRST and FOLLOW sets for grammar rules.\n")
         
-        result = client.call_tool("analyze_first_follow", {
-            "grammar_text": DEMO_GRAMMAR,
-            "rule_name": "expr"
-        })
+        result = prefetched["analyze_first_follow"].result()
         results["analyze_first_follow"] = result
         
-        print(f"  Success: {result.get('success')}")
-        print(f"  Total Parser Rules: {result.get('totalParserRules', 'N/A')}")
-        print(f"  Nullable Rule Count: {result.get('nullableRuleCount', 0)}")
-        print(f"  Rules with Conflicts: {result.get('rulesWithConflicts', 0)}")
-        
-        if result.get('rules'):
+        success, parser_rules, nullable_count, conflicts, rules = pluck(
+            result,
+            success=None,
+            totalParserRules="N/A",
+            nullableRuleCount=0,
+            rulesWithConflicts=0,
+            rules=None,
+        )
+        print(f"  Success: {success}")
+        print(f"  Total Parser Rules: {parser_rules}")
+        print(f"  Nullable Rule Count: {nullable_count}")
+        print(f"  Rules with Conflicts: {conflicts}")
+        
+        if rules:
             print("\n  Rule Analysis:")
-            for rule_info in result.get('rules', [])[:3]:
-                rule_name = rule_info.get('ruleName', 'unknown')
-                first_set = rule_info.get('firstSet', [])
-                follow_set = rule_info.get('followSet', [])
-                nullable = rule_info.get('nullable', False)
+            for rule_info in rules[:3]:
+                rule_name, first_set, follow_set, nullable = pluck(
+                    rule_info, ruleName="unknown", firstSet=[], followSet=[], nullable=False
+                )
                 print(f"    {rule_name}:")
                 print(f"      FIRST: {first_set[:5]}{'...' if len(first_set) > 5 else ''}")
                 print(f"      FOLLOW: {follow_set[:5]}{'...' if len(follow_set) > 5 else ''}")
@@ -262,32 +327,32 @@ ID: [a-z]+ ;
         print_section("Tool 7: analyze_call_graph")
         print("Generates rule dependency/call graph.\n")
         
-        result = client.call_tool("analyze_call_graph", {
-            "grammar_text": DEMO_GRAMMAR,
-            "output_format": "mermaid"
-        })
+        # Fetch the mermaid and DOT renderings as pipelined calls
+        result, result2 = client.call_tools([
+            ("analyze_call_graph", {**client.grammar_args(grammar), "output_format": "mermaid"}),
+            ("analyze_call_graph", {**client.grammar_args(grammar), "output_format": "dot"}),
+        ])
         results["analyze_call_graph"] = result
         
-        print(f"  Success: {result.get('success', True)}")
-        print(f"  Node Count: {result.get('nodeCount', 'N/A')}")
-        print(f"  Edge Count: {result.get('edgeCount', 'N/A')}")
+        success, node_count, edge_count, mermaid = pluck(
+            result, success=True, nodeCount="N/A", edgeCount="N/A", mermaid=""
+        )
+        print(f"  Success: {success}")
+        print(f"  Node Count: {node_count}")
+        print(f"  Edge Count: {edge_count}")
         
-        if result.get('mermaid'):
-            mermaid = result.get('mermaid', '')
-            lines = mermaid.strip().split('\n')
+        if mermaid:
+            lines, more = preview_lines(mermaid, 8)
             print(f"\n  Mermaid Diagram Preview:")
-            for line in lines[:8]:
+            for line in lines:
                 print(f"    {line}")
-            if len(lines) > 8:
-                print(f"    ... ({len(lines) - 8} more lines)")
+            if more:
+                print(f"    ... ({more} more lines)")
         
-        # Also get DOT format
-        result2 = client.call_tool("analyze_call_graph", {
-            "grammar_text": DEMO_GRAMMAR,
-            "output_format": "dot"
-        })
-        if result2.get('dot'):
-            print(f"\n  DOT format also available ({len(result2.get('dot', ''))} chars)")
+        # Also show DOT format
+        dot = result2.get('dot')
+        if dot:
+            print(f"\n  DOT format also available ({len(dot)} chars)")
         
         # ============================================================
         # TOOL 8: profile_grammar
@@ -296,42 +361,37 @@ ID: [a-z]+ ;
         print("Profiles parsing performance.\n")
         
         result = client.call_tool("profile_grammar", {
-            "grammar_text": DEMO_GRAMMAR,
+            **client.grammar_args(grammar),
             "sample_input": DEMO_INPUT,
-            "start_rule": "prog"
-        })
+            "start_rule": "prog",
+            "top_k": 5,
+            "sort_by": "invocations"
+        }, ProfileResult)
         results["profile_grammar"] = result
         
-        print(f"  Success: {result.get('success')}")
-        print(f"  Grammar Name: {result.get('grammarName', 'N/A')}")
-        total_time_ms = result.get('totalTimeNanos', 0) / 1_000_000
+        print(f"  Success: {result.success}")
+        print(f"  Grammar Name: {result.grammarName}")
+        total_time_ms = result.totalTimeNanos / 1_000_000
         print(f"  Total Time: {total_time_ms:.2f} ms")
-        print(f"  Total SLL Lookahead: {result.get('totalSLLLookahead', 0)}")
-        print(f"  Total LL Lookahead: {result.get('totalLLLookahead', 0)}")
-        print(f"  Total DFA States: {result.get('totalDFAStates', 0)}")
+        print(f"  Total SLL Lookahead: {result.totalSLLLookahead}")
+        print(f"  Total LL Lookahead: {result.totalLLLookahead}")
+        print(f"  Total DFA States: {result.totalDFAStates}")
         
-        if result.get('decisions'):
+        if result.decisions:
             print("\n  Top Decisions by Invocations:")
-            decisions = sorted(
-                result.get('decisions', []),
-                key=lambda x: x.get('invocations', 0),
-                reverse=True
-            )[:5]
-            for dec in decisions:
-                rule = dec.get('ruleName', 'unknown')
-                invocations = dec.get('invocations', 0)
-                time_ms = dec.get('timeNanos', 0) / 1_000_000
-                ll_fallback = dec.get('llFallback', 0)
-                print(f"    {rule} (d{dec.get('decisionNumber')}): {invocations} calls, {time_ms:.2f}ms, LL fallback: {ll_fallback}")
-        
-        if result.get('insights'):
+            # The server trims to top_k; re-rank in case it ignores the hint
+            for dec in heapq.nlargest(5, result.decisions, key=attrgetter('invocations')):
+                time_ms = dec.timeNanos / 1_000_000
+                print(f"    {dec.ruleName} (d{dec.decisionNumber}): {dec.invocations} calls, {time_ms:.2f}ms, LL fallback: {dec.llFallback}")
+        
+        if result.insights:
             print("\n  Insights:")
-            for insight in result.get('insights', [])[:3]:
+            for insight in result.insights[:3]:
                 print(f"    - {insight}")
         
-        if result.get('optimizationHints'):
+        if result.optimizationHints:
             print("\n  Optimization Hints:")
-            for hint in result.get('optimizationHints', [])[:3]:
+            for hint in result.optimizationHints[:3]:
                 print(f"    - {hint}")
         
         # ============================================================
@@ -340,44 +400,42 @@ ID: [a-z]+ ;
         print_section("Tool 9: visualize_atn")
         print("Visualizes ATN (Augmented Transition Network) state machines.\n")
         
-        result = client.call_tool("visualize_atn", {
-            "grammar_text": DEMO_GRAMMAR,
-            "rule_name": "expr",
-            "format": "all"
-        })
+        result = prefetched["visualize_atn"].result()
         results["visualize_atn"] = result
         
-        print(f"  Rule: {result.get('ruleName', 'expr')}")
-        print(f"  State Count: {result.get('stateCount', 'N/A')}")
-        print(f"  Transition Count: {result.get('transitionCount', 'N/A')}")
+        rule, state_count, transition_count, mermaid, dot, svg = pluck(
+            result, ruleName="expr", stateCount="N/A", transitionCount="N/A", mermaid="", dot="", svg=""
+        )
+        print(f"  Rule: {rule}")
+        print(f"  State Count: {state_count}")
+        print(f"  Transition Count: {transition_count}")
         
-        if result.get('mermaid'):
-            mermaid = result.get('mermaid', '')
-            lines = mermaid.strip().split('\n')
+        if mermaid:
+            lines, more = preview_lines(mermaid, 6)
             print(f"\n  Mermaid ATN Preview:")
-            for line in lines[:6]:
+            for line in lines:
                 print(f"    {line}")
-            if len(lines) > 6:
-                print(f"    ... ({len(lines) - 6} more lines)")
+            if more:
+                print(f"    ... ({more} more lines)")
         
-        if result.get('dot'):
-            print(f"\n  DOT format: {len(result.get('dot', ''))} chars")
+        if dot:
+            print(f"\n  DOT format: {len(dot)} chars")
         
-        if result.get('svg'):
-            print(f"  SVG format: {len(result.get('svg', ''))} chars")
+        if svg:
+            print(f"  SVG format: {len(svg)} chars")
         
         # ============================================================
         # Summary
         # ============================================================
         print_section("Summary")
         
-        all_passed = True
-        for tool_name, res in results.items():
-            success = res.get('success', True) if isinstance(res, dict) else True
-            status = "✓" if success else "✗"
-            if not success:
-                all_passed = False
-            print(f"  {status} {tool_name}")
+        # A payload without a success field counts as a pass, whether typed or not
+        passed = {
+            name: res.get('success', True) if isinstance(res, dict) else getattr(res, 'success', None) is not False
+            for name, res in results.items()
+        }
+        all_passed = all(passed.values())
+        print("\n".join(f"  {'✓' if ok else '✗'} {name}" for name, ok in passed.items()))
         
         print(f"\n{'='*60}")
         if all_passed:
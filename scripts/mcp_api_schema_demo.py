@@ -9,23 +9,37 @@ Demonstrates:
 """
 
 import argparse
-import json
+import re
 import sys
+from collections import Counter
 from pathlib import Path
 
 # Add parent directory to path to import mcp_client
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import (
+    McpSocketClient,
+    McpStdioClient,
+    ParseResult,
+    ValidateResult,
+    docker_exec_command,
+    read_source,
+    write_generated,
+)
+
+# Parse-tree node names summarised after parsing, counted in a single scan
+NODE_PATTERN = re.compile(r"apiDef|endpoint|typeDef")
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="API Schema DSL demo using ANTLR4 MCP server")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker",
-                   help="Server mode: docker or jar")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker",
+                   help="Server mode: docker, docker-exec or jar")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest",
                    help="Docker image to run (for --server docker)")
     p.add_argument("--jar-path", default="",
                    help="Path to antlr4-mcp-server JAR (for --server jar)")
+    p.add_argument("--socket", default="",
+                   help="Connect to a running mcp_daemon.py instead of starting a server")
     p.add_argument("--target", default="python",
                    choices=["python", "java", "javascript", "typescript", "go", "csharp"],
                    help="Target language for code generation")
@@ -49,12 +63,16 @@ def main() -> int:
     print(f"Output:  {out_dir}")
     print()
 
-    grammar_text = grammar_path.read_text(encoding="utf-8")
-    sample_input = sample_path.read_text(encoding="utf-8")
+    grammar_text = read_source(grammar_path)
+    sample_input = read_source(sample_path)
 
     # Build command based on server mode
-    if args.server == "docker":
+    if args.socket:
+        cmd = []  # the daemon already runs the server; never touch docker
+    elif args.server == "docker":
         cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
     elif args.server == "jar":
         jar_path = args.jar_path.strip()
         if not jar_path:
@@ -63,27 +81,31 @@ def main() -> int:
     else:
         raise RuntimeError(f"Unsupported server mode: {args.server}")
 
-    print(f"Starting MCP server: {' '.join(cmd)}")
-    client = McpStdioClient.start(cmd)
+    if args.socket:
+        print(f"Connecting to MCP daemon: {args.socket}")
+        client = McpSocketClient.connect(args.socket)
+    else:
+        print(f"Starting MCP server: {' '.join(cmd)}")
+        client = McpStdioClient.start(cmd)
     
     try:
         client.initialize()
 
-        tools = client.request("tools/list")
-        if "error" in tools:
-            raise RuntimeError(f"tools/list failed: {tools['error']}")
+        client.list_tools()
+        grammar = client.register_grammar(grammar_text)
         print(f"[ok] Connected to MCP server")
 
         # Step 1: Validate grammar
         print("\n--- Step 1: Validate Grammar ---")
         validation = client.call_tool(
             "validate_grammar",
-            {"grammar_text": grammar_text, "grammar_name": "ApiSchema"},
+            {**client.grammar_args(grammar), "grammar_name": "ApiSchema"},
+            ValidateResult,
         )
-        print(f"[ok] validate_grammar success={validation.get('success')} grammarName={validation.get('grammarName')}")
-        if not validation.get("success", False):
+        print(f"[ok] validate_grammar success={validation.success} grammarName={validation.grammarName}")
+        if not validation.success:
             print("Validation errors:")
-            for err in validation.get("errors", []):
+            for err in validation.errors:
                 print(f"  - {err}")
             return 1
 
@@ -91,7 +113,7 @@ def main() -> int:
         print("\n--- Step 2: Analyze Call Graph ---")
         call_graph = client.call_tool(
             "analyze_call_graph",
-            {"grammar_text": grammar_text},
+            client.grammar_args(grammar),
         )
         print(f"[ok] analyze_call_graph success={call_graph.get('success')}")
         print(f"     Rules: {call_graph.get('ruleCount', 'N/A')}")
@@ -100,27 +122,25 @@ def main() -> int:
         print("\n--- Step 3: Parse Sample Input ---")
         parsed = client.call_tool(
             "parse_sample",
-            {"grammar_text": grammar_text, "sample_input": sample_input, "start_rule": "schema", "show_tokens": False},
+            {**client.grammar_args(grammar), "sample_input": sample_input, "start_rule": "schema", "show_tokens": False},
+            ParseResult,
         )
-        print(f"[ok] parse_sample success={parsed.get('success')}")
-        if not parsed.get("success", False):
+        print(f"[ok] parse_sample success={parsed.success}")
+        if not parsed.success:
             print("Parse errors:")
-            for err in parsed.get("errors", []):
+            for err in parsed.errors:
                 print(f"  - {err}")
             return 1
 
         # Print a summary of what was parsed
-        tree = parsed.get("parseTree", "")
-        api_count = tree.count("apiDef")
-        endpoint_count = tree.count("endpoint")
-        type_count = tree.count("typeDef")
-        print(f"     Parsed: {api_count} APIs, {endpoint_count} endpoints, {type_count} types")
+        counts = Counter(m.group() for m in NODE_PATTERN.finditer(parsed.parseTree))
+        print(f"     Parsed: {counts['apiDef']} APIs, {counts['endpoint']} endpoints, {counts['typeDef']} types")
 
         # Step 4: Check for ambiguity
         print("\n--- Step 4: Detect Ambiguity ---")
         ambiguity = client.call_tool(
             "detect_ambiguity",
-            {"grammar_text": grammar_text, "sample_input": sample_input, "start_rule": "schema"},
+            {**client.grammar_args(grammar), "sample_input": sample_input, "start_rule": "schema"},
         )
         if ambiguity.get("ambiguityDetected", False):
             print("[warn] Ambiguity detected!")
@@ -131,15 +151,25 @@ def main() -> int:
 
         # Step 5: Generate parser code
         print(f"\n--- Step 5: Generate {args.target.title()} Parser ---")
-        compiled = client.call_tool(
+        # Write each generated file as soon as the server sends it
+        out_dir.mkdir(parents=True, exist_ok=True)
+        written: list[str] = []
+
+        def write_file(f: dict) -> None:
+            file_name = write_generated(out_dir, f)
+            if file_name:
+                written.append(file_name)
+
+        compiled = client.call_tool_stream(
             "compile_grammar_multi_target",
             {
-                "grammar_text": grammar_text,
+                **client.grammar_args(grammar),
                 "target_language": args.target,
                 "generate_listener": True,
                 "generate_visitor": True,
                 "include_generated_code": True,
             },
+            write_file,
         )
         print(f"[ok] compile_grammar_multi_target success={compiled.get('success')} fileCount={compiled.get('fileCount')}")
         if not compiled.get("success", False):
@@ -148,20 +178,9 @@ def main() -> int:
                 print(f"  - {err}")
             return 1
 
-        # Write generated files
-        files = compiled.get("files") or []
-        out_dir.mkdir(parents=True, exist_ok=True)
-        wrote = 0
-        for f in files:
-            file_name = f.get("fileName")
-            content = f.get("content")
-            if not file_name or content is None:
-                continue
-            dest = out_dir / file_name
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            dest.write_text(content, encoding="utf-8")
-            wrote += 1
+        for file_name in written:
             print(f"  - {file_name}")
+        wrote = len(written)
 
         print(f"\n[ok] Wrote {wrote} generated files to: {out_dir}")
         
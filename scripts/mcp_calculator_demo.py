@@ -15,14 +15,24 @@ from pathlib import Path
 
 # Add parent directory to path to import mcp_client
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import (
+    McpSocketClient,
+    McpStdioClient,
+    ParseResult,
+    ValidateResult,
+    docker_exec_command,
+    from_result,
+    read_source,
+    write_generated,
+)
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Calculator DSL demo")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
     p.add_argument("--jar-path", default="")
+    p.add_argument("--socket", default="", help="Connect to a running mcp_daemon.py instead of starting a server")
     p.add_argument("--out-dir", default="", help="Output directory for generated code")
     p.add_argument("--target", default="python", help="Target language (python, javascript, java, etc.)")
     p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
@@ -41,11 +51,15 @@ def main() -> int:
     else:
         out_dir = repo_root / "dsl-starter" / "generated" / args.target
 
-    grammar_text = grammar_path.read_text(encoding="utf-8")
-    sample_input = sample_path.read_text(encoding="utf-8") if sample_path.exists() else "2 + 3 * 4"
+    grammar_text = read_source(grammar_path)
+    sample_input = read_source(sample_path, default="2 + 3 * 4")
 
-    if args.server == "docker":
+    if args.socket:
+        cmd = []  # the daemon already runs the server; never touch docker
+    elif args.server == "docker":
         cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
     elif args.server == "jar":
         jar_path = args.jar_path.strip()
         if not jar_path:
@@ -54,25 +68,25 @@ def main() -> int:
     else:
         raise RuntimeError(f"Unsupported server mode: {args.server}")
 
-    client = McpStdioClient.start(cmd)
+    client = McpSocketClient.connect(args.socket) if args.socket else McpStdioClient.start(cmd)
     try:
         client.initialize()
 
         # List available tools
-        tools = client.request("tools/list")
-        if "error" in tools:
-            raise RuntimeError(f"tools/list failed: {tools['error']}")
-        print(f"[ok] Connected to MCP server, {len(tools.get('result', {}).get('tools', []))} tools available")
+        tools = client.list_tools()
+        grammar = client.register_grammar(grammar_text)
+        print(f"[ok] Connected to MCP server, {len(tools)} tools available")
 
         # Validate grammar
         print("\n[1/4] Validating grammar...")
-        validation = client.call_tool(
-            "validate_grammar",
-            {"grammar_text": grammar_text, "grammar_name": "Calculator"},
+        # Keep the raw payload so a failure shows every field the server sent
+        validated = client.call_tool(
+            "validate_grammar", {**client.grammar_args(grammar), "grammar_name": "Calculator"}
         )
-        print(f"[ok] Grammar validation: success={validation.get('success')}")
-        if not validation.get("success", False):
-            print(json.dumps(validation, indent=2))
+        validation = from_result(ValidateResult, validated)
+        print(f"[ok] Grammar validation: success={validation.success}")
+        if not validation.success:
+            print(json.dumps(validated, indent=2))
             return 1
 
         # Parse sample
@@ -80,21 +94,22 @@ def main() -> int:
         parsed = client.call_tool(
             "parse_sample",
             {
-                "grammar_text": grammar_text,
+                **client.grammar_args(grammar),
                 "sample_input": sample_input,
                 "start_rule": "expr",
                 "show_tokens": False,
             },
+            ParseResult,
         )
-        print(f"[ok] Parse result: success={parsed.get('success')}")
-        if parsed.get("success"):
-            print(f"Parse tree: {parsed.get('parseTree', 'N/A')}")
+        print(f"[ok] Parse result: success={parsed.success}")
+        if parsed.success:
+            print(f"Parse tree: {parsed.parseTree or 'N/A'}")
 
         # Detect ambiguities
         print("\n[3/4] Checking for ambiguities...")
         ambiguity = client.call_tool(
             "detect_ambiguity",
-            {"grammar_text": grammar_text},
+            client.grammar_args(grammar),
         )
         has_ambiguities = ambiguity.get("hasAmbiguities", False)
         print(f"[ok] Ambiguity check: hasAmbiguities={has_ambiguities}")
@@ -105,34 +120,31 @@ def main() -> int:
 
         # Generate parser
         print(f"\n[4/4] Generating {args.target} parser...")
-        compiled = client.call_tool(
+        # Write each generated file as soon as the server sends it
+        out_dir.mkdir(parents=True, exist_ok=True)
+        written: list[str] = []
+
+        def write_file(f: dict) -> None:
+            file_name = write_generated(out_dir, f)
+            if file_name:
+                written.append(file_name)
+
+        compiled = client.call_tool_stream(
             "compile_grammar_multi_target",
             {
-                "grammar_text": grammar_text,
+                **client.grammar_args(grammar),
                 "target_language": args.target,
                 "generate_listener": True,
                 "generate_visitor": True,
                 "include_generated_code": True,
             },
+            write_file,
         )
         print(f"[ok] Code generation: success={compiled.get('success')} fileCount={compiled.get('fileCount')}")
         if not compiled.get("success", False):
             print(json.dumps(compiled, indent=2))
             return 1
-
-        # Write generated files
-        files = compiled.get("files") or []
-        out_dir.mkdir(parents=True, exist_ok=True)
-        wrote = 0
-        for f in files:
-            file_name = f.get("fileName")
-            content = f.get("content")
-            if not file_name or content is None:
-                continue
-            dest = out_dir / file_name
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            dest.write_text(content, encoding="utf-8")
-            wrote += 1
+        wrote = len(written)
 
         print(f"\n[ok] Wrote {wrote} generated files to: {out_dir}")
         print("\nNext steps:")
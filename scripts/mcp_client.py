@@ -6,17 +6,486 @@ Reusable across all DSL demo scripts.
 
 from __future__ import annotations
 
+import atexit
+import base64
+import functools
+import hashlib
+import io
 import json
+import mmap
+import os
 import subprocess
-from dataclasses import dataclass
-from typing import Any, Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional, TypeVar, overload
+
+if TYPE_CHECKING:
+    import socket  # imported on first use; stdio-only runs never need it
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib encoder is used otherwise
+    orjson = None
+
+try:
+    import xxhash
+except ImportError:  # optional speedup; grammar keys fall back to sha256
+    xxhash = None
+
+try:
+    import zstandard
+except ImportError:  # optional; grammars are always sent as plain text otherwise
+    zstandard = None
+
+# Smaller grammars gain too little from compression to pay for it
+ZSTD_MIN_GRAMMAR_BYTES = 4096
+
+
+class RawJson(str):
+    """A value already encoded as JSON, spliced into frames without re-escaping."""
+
+
+def _fragment(obj: Any) -> Any:
+    if isinstance(obj, RawJson):
+        return orjson.Fragment(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _dumps(obj: Any) -> bytes:
+    """Encode one compact UTF-8 JSON-RPC frame, splicing RawJson values verbatim."""
+    if orjson is not None and hasattr(orjson, "Fragment"):
+        return orjson.dumps(obj, default=_fragment, option=orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+    # Encode placeholders in place of raw values, then substitute them back
+    raw: list[str] = []
+
+    def swap(value: Any) -> Any:
+        if isinstance(value, RawJson):
+            raw.append(value)
+            return f"\0raw{len(raw) - 1}"
+        if isinstance(value, dict):
+            return {k: swap(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [swap(v) for v in value]
+        return value
+
+    obj = swap(obj)
+    if orjson is not None:
+        text = orjson.dumps(obj).decode("utf-8")
+    else:
+        text = json.dumps(obj, separators=(",", ":"))
+    for i, value in enumerate(raw):
+        text = text.replace(f'"\\u0000raw{i}"', value, 1)
+    return text.encode("utf-8")
+
+
+def format_json(obj: Any) -> str:
+    """Indented JSON for printing tool results."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(obj, indent=2)
+
+
+def _loads(data: str | bytes) -> Any:
+    """Decode one JSON-RPC frame or tool payload."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def content_key(data: bytes) -> str:
+    """Non-cryptographic cache key for grammar content."""
+    if xxhash is not None:
+        return xxhash.xxh3_64_hexdigest(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_source(path: Path, default: Optional[str] = None) -> str:
+    """
+    Read a UTF-8 grammar or sample file through a read-only memory map.
+
+    A missing file yields default when one is given, saving a separate
+    exists() check.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        if default is None:
+            raise
+        return default
+    with f:
+        if f.seek(0, 2) == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:].decode("utf-8")
+
+
+def preview_lines(text: str, n: int) -> tuple[list[str], int]:
+    """
+    Return the first n lines of text, ignoring surrounding whitespace, plus
+    how many lines follow them. Only the previewed prefix is split.
+    """
+    start, end = 0, len(text)
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+
+    lines: list[str] = []
+    while len(lines) < n:
+        nl = text.find("\n", start, end)
+        if nl < 0:
+            lines.append(text[start:end])
+            return lines, 0
+        lines.append(text[start:nl])
+        start = nl + 1
+    return lines, text.count("\n", start, end) + 1
+
+
+# Generated sources are written in one call each; size the buffer to hold them
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Bytes requested per read from the server's stdout or socket
+READ_SIZE = 1 << 16
+
+
+def write_generated(out_dir: Path, f: dict[str, Any]) -> Optional[str]:
+    """Write one generated file entry under out_dir and return its name, or None if incomplete."""
+    file_name = f.get("fileName")
+    content = f.get("content")
+    if not file_name or content is None:
+        return None
+
+    dest = out_dir / file_name
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    _write_file(dest, content)
+    return file_name
+
+
+def write_generated_files(out_dir: Path, files: Iterable[dict[str, Any]], max_workers: int = 4) -> list[str]:
+    """
+    Write generated file entries under out_dir concurrently.
+
+    Only the deepest directories are created, since mkdir(parents=True)
+    makes their ancestors too; returns the written names in the order
+    given, skipping incomplete entries.
+    """
+    complete = [f for f in files if f.get("fileName") and f.get("content") is not None]
+    dirs = {out_dir, *((out_dir / f["fileName"]).parent for f in complete)}
+    for parent in dirs - {p for d in dirs for p in d.parents}:
+        parent.mkdir(parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda f: _write_file(out_dir / f["fileName"], f["content"]), complete))
+    return [f["fileName"] for f in complete]
+
+
+def _write_file(dest: Path, content: str) -> None:
+    with open(dest, "wb", buffering=WRITE_BUFFER_SIZE) as out:
+        out.write(content.encode("utf-8"))
+
+
+# Prefix of the idle containers that --server docker-exec runs the MCP server in
+DOCKER_EXEC_CONTAINER = "antlr4-mcp-daemon"
+
+
+def container_name(image: str) -> str:
+    """Name of the idle container for ``image``; each image gets its own."""
+    return f"{DOCKER_EXEC_CONTAINER}-{content_key(image.encode('utf-8'))[:12]}"
+
+
+def ensure_container(image: str, name: Optional[str] = None) -> str:
+    """
+    Return the id of a running idle container for ``image``.
+
+    The container is named after the image (see container_name()), so
+    switching images never removes a container another run is using. Its
+    id is remembered in ~/.cache/dsl-starter/, so later runs only check the
+    container's state; a stopped container is restarted and an existing one
+    without a remembered id is adopted.
+    """
+    name = name or container_name(image)
+    id_file = Path.home() / ".cache" / "dsl-starter" / f"docker-container-{name}"
+    try:
+        container_id, container_image = id_file.read_text(encoding="utf-8").split()
+    except (OSError, ValueError):
+        container_id = container_image = ""
+
+    if container_id and container_image == image:
+        state = subprocess.run(
+            ["docker", "inspect", "-f", "{{.State.Running}}", container_id], capture_output=True, text=True
+        )
+        if state.returncode == 0:
+            if state.stdout.strip() != "true":
+                subprocess.run(["docker", "start", container_id], check=True, capture_output=True)
+            return container_id
+
+    # The id file may be missing or stale while the named container is still usable
+    named = subprocess.run(
+        ["docker", "inspect", "-f", "{{.Id}} {{.State.Running}} {{.Config.Image}}", name],
+        capture_output=True,
+        text=True,
+    )
+    fields = named.stdout.split() if named.returncode == 0 else []
+    if len(fields) == 3:
+        if fields[2] != image:
+            raise RuntimeError(f"Container {name} runs {fields[2]}, not {image}; remove it or pick another name")
+        container_id = fields[0]
+        if fields[1] != "true":
+            subprocess.run(["docker", "start", container_id], check=True, capture_output=True)
+    else:
+        created = subprocess.run(
+            ["docker", "run", "-d", "--name", name, "--entrypoint", "tail", image, "-f", "/dev/null"],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        container_id = created.stdout.strip()
+    try:
+        id_file.parent.mkdir(parents=True, exist_ok=True)
+        id_file.write_text(f"{container_id} {image}\n", encoding="utf-8")
+    except OSError:
+        pass
+    return container_id
+
+
+def docker_exec_command(image: str, name: Optional[str] = None) -> list[str]:
+    """
+    Return a command running the image's MCP server in a long-lived container.
+
+    The container comes from ensure_container(), so later runs pay for a
+    ``docker exec`` instead of a container create and remove. The server
+    command is the image's own entrypoint and cmd.
+    """
+    container_id = ensure_container(image, name)
+
+    config = subprocess.run(
+        ["docker", "image", "inspect", "-f", "{{json .Config.Entrypoint}}\t{{json .Config.Cmd}}", image],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    entrypoint, cmd = (json.loads(part) or [] for part in config.stdout.strip().split("\t"))
+    return ["docker", "exec", "-i", container_id, *entrypoint, *cmd]
+
+
+def _tool_text(resp: dict[str, Any]) -> str:
+    """Return the raw JSON payload text of a tools/call response."""
+    try:
+        return resp["result"]["content"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        if "error" in resp:
+            raise RuntimeError(f"tools/call error: {resp['error']}") from None
+        raise RuntimeError(f"tools/call returned no text content: {resp}") from None
+
+
+def _tool_result(resp: dict[str, Any]) -> dict[str, Any]:
+    """Decode the JSON payload of a tools/call response."""
+    return _loads(_tool_text(resp))
+
+
+# Tools never answered from the result cache: register_grammar has server-side
+# effects and profile_grammar reports wall-clock timings of the current run
+UNCACHED_TOOLS = frozenset({"register_grammar", "profile_grammar"})
+
+# Grammar analyses depend on nothing but their arguments; their entries never expire
+ANALYSIS_TOOLS = frozenset({"analyze_first_follow", "analyze_call_graph", "visualize_atn", "analyze_left_recursion"})
+
+
+@dataclass
+class ResultCache:
+    """
+    Tool payloads on disk, one directory per tool, keyed by canonical arguments.
+
+    Apart from UNCACHED_TOOLS, the tools the demos call are pure functions of
+    their arguments, so a re-run with the same grammar and inputs can skip
+    the server round-trip.
+    The grammar enters the key as its content key. Entries older than ttl
+    seconds are treated as missing, except for ANALYSIS_TOOLS; with refresh
+    set, nothing is read but fresh results are still stored. Each server
+    (image, jar or daemon socket) gets its own subdirectory, so switching
+    server versions never replays another server's answers.
+    """
+
+    root: Path = field(default_factory=lambda: Path.home() / ".cache" / "dsl-starter" / "mcp")
+    ttl: float = 7 * 24 * 3600
+    refresh: bool = False
+    server: str = ""
+
+    def __post_init__(self) -> None:
+        if self.server:
+            self.root = self.root / content_key(self.server.encode("utf-8"))
+
+    @staticmethod
+    def key(name: str, arguments: dict[str, Any]) -> str:
+        args = dict(arguments)
+        grammar_text = args.pop("grammar_text", None)
+        if isinstance(grammar_text, RawJson):
+            grammar_text = json.loads(grammar_text)
+        if grammar_text is not None:
+            # Same form as a registered grammar_id, so both calling styles share entries
+            args["grammar_id"] = content_key(grammar_text.encode("utf-8"))
+        canonical = json.dumps(args, sort_keys=True, separators=(",", ":"))
+        return f"{name}/{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[str]:
+        if self.refresh:
+            return None
+        path = self.root / f"{key}.json"
+        try:
+            expires = key.partition("/")[0] not in ANALYSIS_TOOLS
+            if expires and time.time() - path.stat().st_mtime > self.ttl:
+                return None
+            return path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        path = self.root / f"{key}.json"
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            pass  # an unwritable cache only costs the next run a round-trip
+
+    @staticmethod
+    def cacheable(name: str, arguments: dict[str, Any]) -> bool:
+        # Calls that write files server-side must reach the server every time
+        return name not in UNCACHED_TOOLS and "output_dir" not in arguments
+
+    def lookup(self, name: str, arguments: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """Return the cached payload of a tool call, or None on a miss."""
+        if not self.cacheable(name, arguments):
+            return None
+        text = self.get(self.key(name, arguments))
+        return None if text is None else _loads(text)
+
+
+T = TypeVar("T")
+
+
+def from_result(cls: type[T], result: dict[str, Any]) -> T:
+    """Build a typed tool result, ignoring fields the type does not declare."""
+    names = _field_names(cls)
+    return cls(**{k: v for k, v in result.items() if k in names})
+
+
+@functools.lru_cache(maxsize=None)
+def _field_names(cls: type) -> frozenset[str]:
+    return frozenset(f.name for f in fields(cls))
+
+
+@dataclass
+class ValidateResult:
+    success: Optional[bool] = None
+    grammarName: Optional[str] = None
+    ruleCount: Any = "N/A"
+    rules: list[str] = field(default_factory=list)
+    errors: list[Any] = field(default_factory=list)
+
+
+@dataclass
+class ParseResult:
+    success: Optional[bool] = None
+    parseTree: str = ""
+    tokens: list[Any] = field(default_factory=list)
+    errors: list[Any] = field(default_factory=list)
+
+
+@dataclass
+class Decision:
+    decisionNumber: Any = None
+    ruleName: str = "unknown"
+    invocations: int = 0
+    timeNanos: int = 0
+    llFallback: int = 0
+    llMaxLook: int = 0
+    ambiguityCount: int = 0
+    dfaStates: int = 0
+    sllDFATransitions: int = 0
+    llDFATransitions: int = 0
+
+
+@dataclass
+class ProfileResult:
+    success: Optional[bool] = None
+    grammarName: str = "N/A"
+    totalTimeNanos: int = 0
+    totalSLLLookahead: int = 0
+    totalLLLookahead: int = 0
+    totalATNTransitions: int = 0
+    totalDFAStates: int = 0
+    decisions: list[Decision] = field(default_factory=list)
+    insights: list[str] = field(default_factory=list)
+    optimizationHints: list[str] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.decisions = [d if isinstance(d, Decision) else from_result(Decision, d) for d in self.decisions]
+
+
+@dataclass
+class FirstFollowRule:
+    ruleName: str = "unknown"
+    firstSet: list[str] = field(default_factory=list)
+    followSet: list[str] = field(default_factory=list)
+    nullable: bool = False
+    hasLL1Conflict: bool = False
+    alternativeCount: int = 0
+
+
+@dataclass
+class FirstFollowDecision:
+    decisionNumber: Any = "?"
+    ruleName: str = "unknown"
+    alternativeCount: int = 0
+    hasAmbiguousLookahead: bool = False
+
+
+@dataclass
+class FirstFollowResult:
+    totalParserRules: Any = "N/A"
+    nullableRuleCount: int = 0
+    rulesWithConflicts: int = 0
+    totalDecisions: Any = "N/A"
+    ambiguousDecisions: int = 0
+    rules: list[FirstFollowRule] = field(default_factory=list)
+    decisions: list[FirstFollowDecision] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.rules = [r if isinstance(r, FirstFollowRule) else from_result(FirstFollowRule, r) for r in self.rules]
+        self.decisions = [
+            d if isinstance(d, FirstFollowDecision) else from_result(FirstFollowDecision, d) for d in self.decisions
+        ]
+
 
 
 @dataclass
 class McpStdioClient:
     command: list[str]
-    proc: subprocess.Popen[str]
+    proc: Optional[subprocess.Popen[bytes]]
     next_id: int = 1
+    tools: Optional[list[dict[str, Any]]] = None
+    protocol_version: Optional[str] = None
+    init_result: Optional[dict[str, Any]] = None
+    keep_open: bool = False
+    cache: Optional[ResultCache] = None
+    grammars: dict[str, RawJson] = field(default_factory=dict)
+    registered: set[str] = field(default_factory=set)
+    # Escaped grammar text -> base64 zstd form, for tools that accept grammar_text_zstd
+    compressed: dict[str, str] = field(default_factory=dict)
+    _pending: dict[int, Future[dict[str, Any]]] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _streams: dict[int, Callable[[dict[str, Any]], None]] = field(default_factory=dict, repr=False)
+    _error: Optional[RuntimeError] = field(default=None, repr=False)
+    _outbox: list[bytes] = field(default_factory=list, repr=False)
+    # Pipe ends bound once in start(), so the write/read paths need no None checks
+    _stdin: IO[bytes] = field(init=False, repr=False)
+    _stdout_fd: int = field(init=False, repr=False)
 
     @classmethod
     def start(cls, command: list[str]) -> "McpStdioClient":
@@ -25,14 +494,19 @@ class McpStdioClient:
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
+            bufsize=io.DEFAULT_BUFFER_SIZE,
         )
         if proc.stdin is None or proc.stdout is None or proc.stderr is None:
             raise RuntimeError("Failed to open stdio pipes")
-        return cls(command=command, proc=proc)
+        client = cls(command=command, proc=proc)
+        client._stdin = proc.stdin
+        client._stdout_fd = proc.stdout.fileno()
+        threading.Thread(target=client._read_loop, name="mcp-reader", daemon=True).start()
+        return client
 
     def close(self) -> None:
+        if self.proc is None or self.keep_open:
+            return
         try:
             if self.proc.stdin:
                 self.proc.stdin.close()
@@ -51,63 +525,374 @@ class McpStdioClient:
                 pass
 
     def request(self, method: str, params: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+        """Send a request and block until the response with its id arrives.
+
+        Safe to call from several threads; responses are matched by id in the
+        background reader, so concurrent requests overlap on the server.
+        """
+        return self.request_async(method, params).result()
+
+    def request_async(
+        self,
+        method: str,
+        params: Optional[dict[str, Any]] = None,
+        on_chunk: Optional[Callable[[dict[str, Any]], None]] = None,
+    ) -> Future[dict[str, Any]]:
+        """
+        Send a request and return a Future for its response, without waiting.
+
+        on_chunk receives the intermediate tool payloads of a streaming tool
+        call; the Future then resolves with the final ``done`` frame.
+        """
+        with self._lock:
+            req, fut = self._new_request(method, params)
+            if on_chunk is not None:
+                self._streams[req["id"]] = on_chunk
+            self._write_frames([_dumps(req) + b"\n"])
+
+        return fut
+
+    def batch(self, requests: list[tuple[str, Optional[dict[str, Any]]]]) -> list[dict[str, Any]]:
+        """
+        Pipeline several requests and return their responses in request order.
+
+        The protocol revision negotiated by initialize() has no JSON-RPC batch
+        frames, so the requests go out as individual frames in a single write.
+        """
+        if not requests:
+            return []
+
+        with self._lock:
+            reqs, futures = zip(*(self._new_request(method, params) for method, params in requests))
+            self._write_frames([_dumps(req) + b"\n" for req in reqs])
+        return [fut.result() for fut in futures]
+
+    def _new_request(
+        self, method: str, params: Optional[dict[str, Any]]
+    ) -> tuple[dict[str, Any], Future[dict[str, Any]]]:
+        """Allocate an id and register its future; callers hold self._lock."""
+        if self._error is not None:
+            raise self._error
+
         req_id = self.next_id
         self.next_id += 1
+        fut: Future[dict[str, Any]] = Future()
+        self._pending[req_id] = fut
 
         req: dict[str, Any] = {"jsonrpc": "2.0", "id": req_id, "method": method}
         if params is not None:
             req["params"] = params
+        return req, fut
 
-        line = json.dumps(req, separators=(",", ":")) + "\n"
-        assert self.proc.stdin is not None
-        self.proc.stdin.write(line)
-        self.proc.stdin.flush()
+    def _write_frames(self, frames: list[bytes]) -> None:
+        """Write frames, after any deferred ones, in a single call; callers hold self._lock."""
+        if self._outbox:
+            frames = self._outbox + frames
+            self._outbox = []
+        self._write(frames[0] if len(frames) == 1 else b"".join(frames))
 
-        assert self.proc.stdout is not None
+    def _write(self, line: bytes) -> None:
+        """Write encoded frames and flush; callers hold self._lock."""
+        self._stdin.write(line)
+        self._stdin.flush()
+
+    def _read_chunk(self) -> bytes:
+        """Read whatever the server has written so far; b"" at end of stream."""
+        return os.read(self._stdout_fd, READ_SIZE)
+
+    def _lines(self) -> Iterator[bytes]:
+        """Split the incoming stream into frames, draining all buffered data per read."""
+        buf = bytearray()
         while True:
-            out_line = self.proc.stdout.readline()
-            if out_line == "":
-                err = ""
-                if self.proc.stderr is not None:
-                    err = self.proc.stderr.read()
-                raise RuntimeError(f"MCP server exited unexpectedly.\ncommand={self.command}\nstderr:\n{err}")
-
-            out_line = out_line.strip()
-            if not out_line:
+            data = self._read_chunk()
+            if not data:
+                break
+            # Only the newly read bytes can hold a delimiter not seen before
+            scan = len(buf)
+            buf += data
+            start = 0
+            while (end := buf.find(b"\n", scan)) != -1:
+                yield bytes(buf[start:end])
+                start = scan = end + 1
+            del buf[:start]
+        if buf:
+            yield bytes(buf)
+
+    def _stderr(self) -> str:
+        if self.proc is None or self.proc.stderr is None:
+            return ""
+        return self.proc.stderr.read().decode("utf-8", errors="replace")
+
+    def _read_loop(self) -> None:
+        """Dispatch server responses to the pending request futures."""
+        # Frames stay bytes end to end; both decoders skip the trailing newline
+        for out_line in self._lines():
+            if not out_line or out_line.isspace():
                 continue
 
-            resp = json.loads(out_line)
-            if resp.get("id") == req_id:
-                return resp
+            try:
+                msg = _loads(out_line)
+            except ValueError as e:
+                # A stream that is out of sync cannot be matched to requests any more
+                self._fail_pending(RuntimeError(f"Malformed frame from MCP server: {out_line[:200]!r} ({e})"))
+                return
+            for resp in msg if isinstance(msg, list) else [msg]:
+                if isinstance(resp, dict):
+                    self._dispatch(resp)
+
+        err = self._stderr()
+        self._fail_pending(RuntimeError(f"MCP server exited unexpectedly.\ncommand={self.command}\nstderr:\n{err}"))
 
-    def notify(self, method: str, params: Optional[dict[str, Any]] = None) -> None:
+    def _fail_pending(self, error: RuntimeError) -> None:
+        """Fail every outstanding request and refuse new ones."""
+        with self._lock:
+            self._error = error
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._streams.clear()
+        for fut in pending:
+            fut.set_exception(error)
+
+    def _dispatch(self, resp: dict[str, Any]) -> None:
+        req_id = resp.get("id")
+        on_chunk = self._streams.get(req_id)
+        if on_chunk is not None and "result" in resp:
+            try:
+                payload = _tool_result(resp)
+                if not payload.get("done"):
+                    on_chunk(payload)
+                    return
+            except Exception as e:
+                # Fail just this request; the reader keeps serving the others
+                with self._lock:
+                    self._streams.pop(req_id, None)
+                    fut = self._pending.pop(req_id, None)
+                if fut is not None:
+                    fut.set_exception(e)
+                return
+
+        with self._lock:
+            self._streams.pop(req_id, None)
+            fut = self._pending.pop(req_id, None)
+        if fut is not None:
+            fut.set_result(resp)
+
+    def notify(self, method: str, params: Optional[dict[str, Any]] = None, defer: bool = False) -> None:
+        """
+        Send a notification.
+
+        With defer the frame is held back and written together with the
+        next outgoing message instead of costing a write of its own.
+        """
         req: dict[str, Any] = {"jsonrpc": "2.0", "method": method}
         if params is not None:
             req["params"] = params
 
-        line = json.dumps(req, separators=(",", ":")) + "\n"
-        assert self.proc.stdin is not None
-        self.proc.stdin.write(line)
-        self.proc.stdin.flush()
+        with self._lock:
+            if defer:
+                self._outbox.append(_dumps(req) + b"\n")
+            else:
+                self._write_frames([_dumps(req) + b"\n"])
 
-    def call_tool(self, name: str, arguments: dict[str, Any]) -> dict[str, Any]:
-        resp = self.request("tools/call", {"name": name, "arguments": arguments})
-        if "error" in resp:
-            raise RuntimeError(f"tools/call error: {resp['error']}")
+    @overload
+    def call_tool(self, name: str, arguments: dict[str, Any]) -> dict[str, Any]: ...
 
-        result = resp.get("result") or {}
-        content = result.get("content") or []
-        if not content:
-            raise RuntimeError(f"tools/call returned no content: {resp}")
+    @overload
+    def call_tool(self, name: str, arguments: dict[str, Any], result_type: type[T]) -> T: ...
 
-        text = content[0].get("text")
-        if not isinstance(text, str):
-            raise RuntimeError(f"Unexpected content payload: {content[0]}")
+    def call_tool(self, name: str, arguments: dict[str, Any], result_type: Optional[type[Any]] = None) -> Any:
+        """Call a tool and return its JSON payload, or a result_type instance when given."""
+        return self.call_tool_async(name, arguments, result_type).result()
+
+    def call_tool_async(
+        self, name: str, arguments: dict[str, Any], result_type: Optional[type[Any]] = None
+    ) -> Future[Any]:
+        """
+        Start a tool call and return a Future for its decoded result.
+
+        Independent calls started back to back are in flight together, so
+        the server can work on them concurrently.
+        """
+        out: Future[Any] = Future()
+
+        def decode(text: Future[str]) -> None:
+            try:
+                result = _loads(text.result())
+                out.set_result(from_result(result_type, result) if result_type is not None else result)
+            except Exception as e:
+                out.set_exception(e)
+
+        self._call_tool_text(name, arguments).add_done_callback(decode)
+        return out
+
+    def call_tool_items(
+        self, name: str, arguments: dict[str, Any], array_key: str
+    ) -> tuple[dict[str, Any], Iterator[dict[str, Any]]]:
+        """
+        Call a tool whose payload is dominated by one array.
+
+        Returns (rest, items): items yields the array elements and rest holds
+        the payload's other members.
+        """
+        rest = self.call_tool(name, arguments)
+        return rest, iter(rest.pop(array_key, None) or [])
+
+    def _call_tool_text(self, name: str, arguments: dict[str, Any]) -> Future[str]:
+        """Start a tool call and return a Future for its raw JSON payload text."""
+        out: Future[str] = Future()
+        key = self._cache_key(name, arguments)
+
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            out.set_result(cached)
+            return out
+
+        def unwrap(resp: Future[dict[str, Any]]) -> None:
+            try:
+                text = _tool_text(resp.result())
+                if key is not None:
+                    self._store(key, resp.result(), text)
+                out.set_result(text)
+            except Exception as e:
+                out.set_exception(e)
 
-        return json.loads(text)
+        params = {"name": name, "arguments": self._wire_arguments(name, arguments)}
+        self.request_async("tools/call", params).add_done_callback(unwrap)
+        return out
+
+    def call_tools(self, calls: list[tuple[str, dict[str, Any]]]) -> list[dict[str, Any]]:
+        """
+        Call several tools and return their payloads in the order of calls.
+
+        The calls are pipelined: every request is written before any response
+        is awaited, and the reader thread matches the answers up by id.
+        """
+        futures = [self.call_tool_async(name, arguments) for name, arguments in calls]
+        return [fut.result() for fut in futures]
+
+    def _store(self, key: str, resp: dict[str, Any], text: str) -> None:
+        """Cache a tool payload unless the reply reports an error."""
+        if (resp.get("result") or {}).get("isError"):
+            return
+        try:
+            payload = _loads(text)
+        except ValueError:
+            return
+        if isinstance(payload, dict) and payload.get("success") is not False:
+            self.cache.put(key, text)
+
+    def _cache_key(self, name: str, arguments: dict[str, Any]) -> Optional[str]:
+        if self.cache is None or not self.cache.cacheable(name, arguments):
+            return None
+        return self.cache.key(name, arguments)
+
+    def _wire_arguments(self, name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+        """Swap a large grammar for its compressed form if this tool accepts one."""
+        text = arguments.get("grammar_text")
+        zstd = self.compressed.get(text) if isinstance(text, RawJson) else None
+        if zstd is None or not self.accepts_argument(name, "grammar_text_zstd"):
+            return arguments
+        return {k: v for k, v in arguments.items() if k != "grammar_text"} | {"grammar_text_zstd": zstd}
+
+    def call_tool_stream(
+        self,
+        name: str,
+        arguments: dict[str, Any],
+        on_chunk: Callable[[dict[str, Any]], None],
+    ) -> dict[str, Any]:
+        """
+        Call a tool and hand each generated file to on_chunk as it arrives.
+
+        Servers exposing ``<name>_stream`` answer with one frame per file
+        under the request id, ending with a ``{"done": true, ...}`` summary.
+        Other servers get the regular tool, whose ``files`` are replayed
+        through on_chunk and dropped from the returned result, as are
+        cached results.
+        """
+        stream_name = f"{name}_stream"
+        key = self._cache_key(name, arguments)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None or not self.has_tool(stream_name):
+            result = _loads(cached) if cached is not None else self.call_tool(name, arguments)
+            for chunk in result.pop("files", None) or []:
+                on_chunk(chunk)
+            return result
+
+        files: list[dict[str, Any]] = []
+
+        def collect(chunk: dict[str, Any]) -> None:
+            files.append(chunk)
+            on_chunk(chunk)
+
+        fut = self.request_async(
+            "tools/call", {"name": stream_name, "arguments": self._wire_arguments(stream_name, arguments)}, collect
+        )
+        resp = fut.result()
+        result = _tool_result(resp)
+        if key is not None:
+            # Stored in the regular tool's shape, so either calling style can reuse it
+            self._store(key, resp, _dumps({**result, "files": files}).decode("utf-8"))
+        return result
+
+    def list_tools(self) -> list[dict[str, Any]]:
+        """Return the server's tool list, fetched once per connection."""
+        if self.tools is None:
+            resp = self.request("tools/list")
+            if "error" in resp:
+                raise RuntimeError(f"tools/list failed: {resp['error']}")
+            self.tools = (resp.get("result") or {}).get("tools", [])
+        return self.tools
+
+    def has_tool(self, name: str) -> bool:
+        return any(t.get("name") == name for t in self.list_tools())
+
+    def accepts_argument(self, name: str, argument: str) -> bool:
+        """Whether the server's input schema for a tool declares an argument."""
+        for t in self.list_tools():
+            if t.get("name") == name:
+                return argument in ((t.get("inputSchema") or {}).get("properties") or {})
+        return False
+
+    def register_grammar(self, grammar_text: str) -> str:
+        """
+        Register grammar text once and return its content key.
+
+        Servers exposing a ``register_grammar`` tool cache the parsed grammar
+        under the key, so later calls only send the key. Older servers
+        keep receiving the full text via grammar_args(); a large grammar is
+        sent zstd-compressed to each tool whose schema accepts
+        grammar_text_zstd.
+        """
+        data = grammar_text.encode("utf-8")
+        key = content_key(data)
+        if key in self.grammars:
+            return key
+
+        # Escape the grammar once; fallback calls splice it into each frame
+        self.grammars[key] = RawJson(json.dumps(grammar_text))
+        if self.has_tool("register_grammar"):
+            self.call_tool("register_grammar", {"grammar_text": grammar_text, "id": key})
+            self.registered.add(key)
+        elif (
+            zstandard is not None
+            and len(data) >= ZSTD_MIN_GRAMMAR_BYTES
+            and any(self.accepts_argument(t["name"], "grammar_text_zstd") for t in self.list_tools())
+        ):
+            zstd = zstandard.ZstdCompressor(level=3).compress(data)
+            self.compressed[self.grammars[key]] = base64.b64encode(zstd).decode("ascii")
+        return key
+
+    def grammar_args(self, key: str) -> dict[str, Any]:
+        """Tool arguments that reference a grammar returned by register_grammar()."""
+        if key in self.registered:
+            return {"grammar_id": key}
+        return {"grammar_text": self.grammars[key]}
+
+    def initialize(self) -> dict[str, Any]:
+        """Perform MCP handshake and return the server's initialize result."""
+        if self.init_result is not None:
+            return self.init_result
 
-    def initialize(self) -> None:
-        """Perform MCP handshake."""
         init_resp = self.request(
             "initialize",
             {
@@ -119,4 +904,93 @@ class McpStdioClient:
         if "error" in init_resp:
             raise RuntimeError(f"initialize failed: {init_resp['error']}")
 
-        self.notify("notifications/initialized")
+        result = init_resp.get("result") or {}
+        self.protocol_version = result.get("protocolVersion")
+        self.init_result = result
+        # Sent ahead of the first real request, still after the initialize response
+        self.notify("notifications/initialized", defer=True)
+        return result
+
+
+class McpServerHandle:
+    """
+    One running server per command, shared by everything in the process.
+
+    get_or_start() hands out the same initialized-once client for identical
+    commands, with per-caller settings such as the result cache reset. The
+    clients ignore close() and are shut down at exit.
+    """
+
+    _clients: dict[tuple[str, ...], McpStdioClient] = {}
+    _lock = threading.Lock()
+    _start = staticmethod(McpStdioClient.start)
+
+    @classmethod
+    def get_or_start(cls, command: list[str]) -> McpStdioClient:
+        key = tuple(command)
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None or client._error is not None:
+                if not cls._clients:
+                    atexit.register(cls.close_all)
+                client = cls._start(command)
+                client.keep_open = True
+                cls._clients[key] = client
+            client.cache = None
+            return client
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._lock:
+            for client in cls._clients.values():
+                client.keep_open = False
+                client.close()
+            cls._clients.clear()
+
+
+@dataclass
+class McpSocketClient(McpStdioClient):
+    """
+    McpStdioClient over a Unix socket served by mcp_daemon.py.
+
+    The daemon keeps one MCP server process warm, so demos skip the
+    Docker/JVM cold start on every run.
+    """
+
+    sock: Optional[socket.socket] = None
+
+    @classmethod
+    def connect(cls, path: str) -> "McpSocketClient":
+        import socket
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        client = cls(
+            command=[f"unix:{path}"],
+            proc=None,
+            sock=sock,
+        )
+        threading.Thread(target=client._read_loop, name="mcp-reader", daemon=True).start()
+        return client
+
+    def close(self) -> None:
+        if self.sock is None:
+            return
+        import socket
+
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _write(self, line: bytes) -> None:
+        assert self.sock is not None
+        self.sock.sendall(line)
+
+    def _read_chunk(self) -> bytes:
+        assert self.sock is not None
+        try:
+            return self.sock.recv(READ_SIZE)
+        except OSError:
+            return b""  # closed locally while the reader was waiting
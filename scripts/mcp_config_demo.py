@@ -11,16 +11,17 @@ import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import McpSocketClient, McpStdioClient, docker_exec_command, read_source, write_generated_files
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Config DSL demo")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
     p.add_argument("--out-dir", default="")
     p.add_argument("--target", default="python")
     p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
+    p.add_argument("--socket", default="", help="Connect to a running mcp_daemon.py instead of starting a server")
     return p.parse_args()
 
 
@@ -36,26 +37,29 @@ def main() -> int:
     else:
         out_dir = repo_root / "dsl-starter" / "generated" / args.target
 
-    grammar_text = grammar_path.read_text(encoding="utf-8")
-    sample_input = (
-        sample_path.read_text(encoding="utf-8")
-        if sample_path.exists()
-        else """[server]
+    grammar_text = read_source(grammar_path)
+    sample_input = read_source(
+        sample_path,
+        default="""[server]
 host = localhost
 port = 8080
 
 [database]
 url = postgresql://localhost/mydb
 pool_size = 10
-"""
+""",
     )
 
-    if args.server == "docker":
+    if args.socket:
+        cmd = []  # the daemon already runs the server; never touch docker
+    elif args.server == "docker":
         cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
     else:
         raise RuntimeError("Only docker mode supported")
 
-    client = McpStdioClient.start(cmd)
+    client = McpSocketClient.connect(args.socket) if args.socket else McpStdioClient.start(cmd)
     try:
         client.initialize()
 
@@ -93,16 +97,8 @@ pool_size = 10
             print(json.dumps(compiled, indent=2))
             return 1
 
-        files = compiled.get("files") or []
-        out_dir.mkdir(parents=True, exist_ok=True)
-        for f in files:
-            file_name = f.get("fileName")
-            content = f.get("content")
-            if file_name and content is not None:
-                (out_dir / file_name).parent.mkdir(parents=True, exist_ok=True)
-                (out_dir / file_name).write_text(content, encoding="utf-8")
-
-        print(f"[ok] Generated {len(files)} files to {out_dir}")
+        written = write_generated_files(out_dir, compiled.get("files") or [])
+        print(f"[ok] Generated {len(written)} files to {out_dir}")
         return 0
     finally:
         client.close()
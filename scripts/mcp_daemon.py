@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Keep one ANTLR4 MCP server warm and share it over a Unix socket.
+
+Start the daemon once, then pass --socket to the demo scripts so they reuse
+the running server instead of paying Docker/JVM startup on every run:
+
+    python mcp_daemon.py --socket /tmp/antlr4-mcp.sock &
+    python mcp_all_tools_demo.py --socket /tmp/antlr4-mcp.sock
+"""
+
+import argparse
+import os
+import queue
+import socketserver
+import sys
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+from mcp_client import McpStdioClient, _dumps, _loads, docker_exec_command
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Share one ANTLR4 MCP server over a Unix socket")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
+    p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
+    p.add_argument("--jar-path", default="")
+    p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
+    p.add_argument("--socket", default="/tmp/antlr4-mcp.sock", help="Unix socket path to listen on")
+    return p.parse_args()
+
+
+class McpDaemon(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, upstream: McpStdioClient, init_result: dict[str, Any]):
+        super().__init__(path, McpConnection)
+        self.upstream = upstream
+        self.init_result = init_result
+
+
+class McpConnection(socketserver.StreamRequestHandler):
+    """
+    Relay one client's JSON-RPC stream to the shared server.
+
+    The daemon already performed the MCP handshake, so each client's
+    initialize is answered from the cached result. Other requests are
+    relayed without blocking the connection and answered under the
+    client's id as soon as the shared server responds.
+
+    Responses are queued for a writer thread of the connection's own, so
+    the shared server's reader never blocks on a slow client.
+    """
+
+    server: McpDaemon
+
+    def handle(self) -> None:
+        self._outbox: queue.SimpleQueue[Optional[bytes]] = queue.SimpleQueue()
+        writer = threading.Thread(target=self._write_loop, name="mcp-daemon-writer", daemon=True)
+        writer.start()
+        try:
+            self._read_requests()
+        finally:
+            # Flush what is already queued before the socket is closed
+            self._outbox.put(None)
+            writer.join()
+
+    def _read_requests(self) -> None:
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                msg = _loads(line)
+            except ValueError as e:
+                self._reply({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}})
+                continue
+            if isinstance(msg, list):
+                threading.Thread(target=self._forward_batch, args=(msg,), daemon=True).start()
+                continue
+            if not isinstance(msg, dict):
+                self._reply({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Invalid Request"}})
+                continue
+            if "id" not in msg:
+                if msg.get("method") != "notifications/initialized":
+                    self.server.upstream.notify(msg["method"], msg.get("params"))
+                continue
+
+            self._forward(msg)
+
+    def _forward(self, msg: dict[str, Any]) -> None:
+        if msg.get("method") == "initialize":
+            self._reply({"jsonrpc": "2.0", "id": msg["id"], "result": self.server.init_result})
+            return
+
+        def relay(fut: Future[dict[str, Any]]) -> None:
+            try:
+                resp = dict(fut.result())
+            except RuntimeError as e:
+                resp = {"jsonrpc": "2.0", "error": {"code": -32603, "message": str(e)}}
+            resp["id"] = msg["id"]
+            self._reply(resp)
+
+        def relay_chunk(payload: dict[str, Any]) -> None:
+            # Streaming tools answer with several frames under one id
+            content = [{"type": "text", "text": _dumps(payload).decode("utf-8")}]
+            self._reply({"jsonrpc": "2.0", "id": msg["id"], "result": {"content": content}})
+
+        params = msg.get("params")
+        streaming = msg.get("method") == "tools/call" and str((params or {}).get("name", "")).endswith("_stream")
+        try:
+            fut = self.server.upstream.request_async(msg["method"], params, relay_chunk if streaming else None)
+            fut.add_done_callback(relay)
+        except RuntimeError as e:
+            self._reply({"jsonrpc": "2.0", "id": msg["id"], "error": {"code": -32603, "message": str(e)}})
+
+    def _forward_batch(self, msgs: list[dict[str, Any]]) -> None:
+        requests = [m for m in msgs if "id" in m]
+        for m in msgs:
+            if "id" not in m:
+                self.server.upstream.notify(m["method"], m.get("params"))
+        if not requests:
+            return
+
+        try:
+            resps = self.server.upstream.batch([(m["method"], m.get("params")) for m in requests])
+        except RuntimeError as e:
+            resps = [{"jsonrpc": "2.0", "error": {"code": -32603, "message": str(e)}} for _ in requests]
+        for m, resp in zip(requests, resps):
+            resp["id"] = m["id"]
+        self._reply(resps)
+
+    def _reply(self, resp: Any) -> None:
+        self._outbox.put(_dumps(resp) + b"\n")
+
+    def _write_loop(self) -> None:
+        """Write queued responses, coalescing whatever has piled up into one send."""
+        while True:
+            frames = [self._outbox.get()]
+            try:
+                while frames[-1] is not None:
+                    frames.append(self._outbox.get_nowait())
+            except queue.Empty:
+                pass
+            done = frames[-1] is None
+            if done:
+                frames.pop()
+            try:
+                if frames:
+                    self.wfile.write(b"".join(frames))
+                    self.wfile.flush()
+            except (OSError, ValueError):
+                return  # client went away before its responses arrived
+            if done:
+                return
+
+
+def main() -> int:
+    args = parse_args()
+
+    if args.server == "docker":
+        cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
+    elif args.server == "jar":
+        repo_root = Path(args.repo_root).resolve()
+        jar_path = args.jar_path.strip()
+        if not jar_path:
+            jar_path = str(repo_root / "antlr4-mcp-server" / "target" / "antlr4-mcp-server-0.2.0.jar")
+        cmd = ["java", "-jar", jar_path]
+    else:
+        raise RuntimeError(f"Unsupported server mode: {args.server}")
+
+    upstream = McpStdioClient.start(cmd)
+    try:
+        init_result = upstream.initialize()
+
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        with McpDaemon(args.socket, upstream, init_result) as server:
+            print(f"[ok] Serving {' '.join(cmd)} on {args.socket} (Ctrl+C to stop)")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return 0
+    finally:
+        upstream.close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
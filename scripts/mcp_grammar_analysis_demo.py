@@ -10,21 +10,30 @@ Demonstrates:
 """
 
 import argparse
-import json
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import (
+    FirstFollowResult,
+    McpSocketClient,
+    McpStdioClient,
+    ResultCache,
+    docker_exec_command,
+    preview_lines,
+)
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Grammar Analysis Demo")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
     p.add_argument("--jar-path", default="")
     p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
     p.add_argument("--output-dir", default="", help="Directory to save visualizations")
+    p.add_argument("--no-cache", action="store_true", help="Always ask the server instead of reusing cached results")
+    p.add_argument("--refresh", action="store_true", help="Recompute cached results and store the fresh ones")
+    p.add_argument("--socket", default="", help="Connect to a running mcp_daemon.py instead of starting a server")
     return p.parse_args()
 
 
@@ -68,8 +77,12 @@ ID: [a-z]+ ;
 def main() -> int:
     args = parse_args()
     
-    if args.server == "docker":
+    if args.socket:
+        cmd = []  # the daemon already runs the server; never touch docker
+    elif args.server == "docker":
         cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
     else:
         repo_root = Path(args.repo_root).resolve()
         jar_path = args.jar_path.strip() or str(repo_root / "antlr4-mcp-server" / "target" / "antlr4-mcp-server-0.2.0.jar")
@@ -83,12 +96,43 @@ def main() -> int:
     print("  ANTLR4 Grammar Analysis Demo")
     print("="*70)
 
-    client = McpStdioClient.start(cmd)
+    client = McpSocketClient.connect(args.socket) if args.socket else McpStdioClient.start(cmd)
+    if not args.no_cache:
+        # Each server (image, jar or daemon) keeps its own cached results
+        server = f"unix:{args.socket}" if args.socket else jar_path if args.server == "jar" else args.image
+        client.cache = ResultCache(refresh=args.refresh, server=server)
     
     try:
         client.initialize()
         print("✓ Connected to MCP server\n")
 
+        expr = client.register_grammar(EXPR_GRAMMAR)
+        indirect = client.register_grammar(INDIRECT_LR_GRAMMAR)
+
+        # Every analysis below is independent: start them all up front so the
+        # server works on them concurrently, then render each section in order
+        left_recursion = client.call_tool_async("analyze_left_recursion", client.grammar_args(expr))
+        indirect_left_recursion = client.call_tool_async("analyze_left_recursion", client.grammar_args(indirect))
+        first_follow = client.call_tool_async("analyze_first_follow", client.grammar_args(expr), FirstFollowResult)
+        call_graph_mermaid = client.call_tool_async("analyze_call_graph", {
+            **client.grammar_args(expr),
+            "output_format": "mermaid"
+        })
+        call_graph_dot = client.call_tool_async("analyze_call_graph", {
+            **client.grammar_args(expr),
+            "output_format": "dot"
+        })
+        atn_expr = client.call_tool_async("visualize_atn", {
+            **client.grammar_args(expr),
+            "rule_name": "expr",
+            "format": "all"
+        })
+        atn_stat = client.call_tool_async("visualize_atn", {
+            **client.grammar_args(expr),
+            "rule_name": "stat",
+            "format": "mermaid"
+        })
+
         # ============================================================
         # 1. Left Recursion Analysis
         # ============================================================
@@ -100,9 +144,7 @@ def main() -> int:
         
         # Analyze expression grammar (direct left recursion)
         print("--- Expression Grammar (Direct Left Recursion) ---")
-        result = client.call_tool("analyze_left_recursion", {
-            "grammar_text": EXPR_GRAMMAR
-        })
+        result = left_recursion.result()
         
         print(f"Has Left Recursion: {result.get('hasLeftRecursion', False)}")
         print(f"Has Direct Left Recursion: {result.get('hasDirectLeftRecursion', False)}")
@@ -122,9 +164,7 @@ def main() -> int:
         
         # Analyze indirect left recursion grammar
         print("\n--- Indirect Left Recursion Grammar ---")
-        result2 = client.call_tool("analyze_left_recursion", {
-            "grammar_text": INDIRECT_LR_GRAMMAR
-        })
+        result2 = indirect_left_recursion.result()
         
         print(f"Has Indirect Left Recursion: {result2.get('hasIndirectLeftRecursion', False)}")
         if result2.get('cycles'):
@@ -139,41 +179,34 @@ def main() -> int:
         print("\nFIRST(A) = terminals that can begin strings derived from A")
         print("FOLLOW(A) = terminals that can appear after A in any derivation\n")
         
-        result = client.call_tool("analyze_first_follow", {
-            "grammar_text": EXPR_GRAMMAR
-        })
+        result = first_follow.result()
         
-        print(f"Total Parser Rules: {result.get('totalParserRules', 'N/A')}")
-        print(f"Nullable Rules: {result.get('nullableRuleCount', 0)}")
-        print(f"Rules with LL(1) Conflicts: {result.get('rulesWithConflicts', 0)}")
-        print(f"Total Decisions: {result.get('totalDecisions', 'N/A')}")
-        print(f"Ambiguous Decisions: {result.get('ambiguousDecisions', 0)}")
+        print(f"Total Parser Rules: {result.totalParserRules}")
+        print(f"Nullable Rules: {result.nullableRuleCount}")
+        print(f"Rules with LL(1) Conflicts: {result.rulesWithConflicts}")
+        print(f"Total Decisions: {result.totalDecisions}")
+        print(f"Ambiguous Decisions: {result.ambiguousDecisions}")
         
-        if result.get('rules'):
+        if result.rules:
             print("\n--- Rule Analysis ---")
-            for rule_info in result.get('rules', []):
-                rule_name = rule_info.get('ruleName', 'unknown')
-                first_set = rule_info.get('firstSet', [])
-                follow_set = rule_info.get('followSet', [])
-                nullable = rule_info.get('nullable', False)
-                has_conflict = rule_info.get('hasLL1Conflict', False)
-                alt_count = rule_info.get('alternativeCount', 0)
+            for rule in result.rules:
+                first_set = rule.firstSet
+                follow_set = rule.followSet
                 
-                print(f"\n  {rule_name}:")
-                print(f"    Alternatives: {alt_count}")
-                print(f"    Nullable: {nullable}")
-                print(f"    LL(1) Conflict: {has_conflict}")
+                print(f"\n  {rule.ruleName}:")
+                print(f"    Alternatives: {rule.alternativeCount}")
+                print(f"    Nullable: {rule.nullable}")
+                print(f"    LL(1) Conflict: {rule.hasLL1Conflict}")
                 print(f"    FIRST: {', '.join(first_set[:8])}{'...' if len(first_set) > 8 else ''}")
                 print(f"    FOLLOW: {', '.join(follow_set[:8])}{'...' if len(follow_set) > 8 else ''}")
         
-        if result.get('decisions'):
+        if result.decisions:
             print("\n--- Decision Point Analysis ---")
-            for dec in result.get('decisions', [])[:3]:
-                dec_num = dec.get('decisionNumber', '?')
-                rule_name = dec.get('ruleName', 'unknown')
-                alt_count = dec.get('alternativeCount', 0)
-                ambiguous = dec.get('hasAmbiguousLookahead', False)
-                print(f"  Decision {dec_num} in {rule_name}: {alt_count} alternatives, ambiguous={ambiguous}")
+            for dec in result.decisions[:3]:
+                print(
+                    f"  Decision {dec.decisionNumber} in {dec.ruleName}: "
+                    f"{dec.alternativeCount} alternatives, ambiguous={dec.hasAmbiguousLookahead}"
+                )
 
         # ============================================================
         # 3. Call Graph Analysis
@@ -183,11 +216,8 @@ def main() -> int:
         print("="*70)
         print("\nVisualize which rules call which other rules.\n")
         
-        # Get Mermaid format
-        result = client.call_tool("analyze_call_graph", {
-            "grammar_text": EXPR_GRAMMAR,
-            "output_format": "mermaid"
-        })
+        # Mermaid format
+        result = call_graph_mermaid.result()
         
         print(f"Success: {result.get('success', True)}")
         
@@ -201,20 +231,17 @@ def main() -> int:
                 (output_dir / "call_graph.mmd").write_text(mermaid)
                 print(f"\nSaved to: {output_dir / 'call_graph.mmd'}")
         
-        # Get DOT format
-        result2 = client.call_tool("analyze_call_graph", {
-            "grammar_text": EXPR_GRAMMAR,
-            "output_format": "dot"
-        })
+        # DOT format
+        result2 = call_graph_dot.result()
         
         if result2.get('dot'):
             dot = result2.get('dot', '')
             print("\n--- DOT Format (Graphviz) ---")
-            lines = dot.strip().split('\n')
-            for line in lines[:10]:
+            lines, more = preview_lines(dot, 10)
+            for line in lines:
                 print(line)
-            if len(lines) > 10:
-                print(f"... ({len(lines) - 10} more lines)")
+            if more:
+                print(f"... ({more} more lines)")
             
             if output_dir:
                 (output_dir / "call_graph.dot").write_text(dot)
@@ -229,11 +256,7 @@ def main() -> int:
         print("="*70)
         print("\nThe ATN is ANTLR's internal state machine representation.\n")
         
-        result = client.call_tool("visualize_atn", {
-            "grammar_text": EXPR_GRAMMAR,
-            "rule_name": "expr",
-            "format": "all"
-        })
+        result = atn_expr.result()
         
         print(f"Rule: {result.get('ruleName', 'expr')}")
         print(f"State Count: {result.get('stateCount', 'N/A')}")
@@ -242,11 +265,11 @@ def main() -> int:
         if result.get('mermaid'):
             mermaid = result.get('mermaid', '')
             print("\n--- ATN State Diagram (Mermaid) ---")
-            lines = mermaid.strip().split('\n')
-            for line in lines[:15]:
+            lines, more = preview_lines(mermaid, 15)
+            for line in lines:
                 print(line)
-            if len(lines) > 15:
-                print(f"... ({len(lines) - 15} more lines)")
+            if more:
+                print(f"... ({more} more lines)")
             
             if output_dir:
                 (output_dir / "atn_expr.mmd").write_text(mermaid)
@@ -259,11 +282,7 @@ def main() -> int:
         
         # Also visualize 'stat' rule
         print("\n--- ATN for 'stat' rule ---")
-        result2 = client.call_tool("visualize_atn", {
-            "grammar_text": EXPR_GRAMMAR,
-            "rule_name": "stat",
-            "format": "mermaid"
-        })
+        result2 = atn_stat.result()
         
         print(f"State Count: {result2.get('stateCount', 'N/A')}")
         print(f"Transition Count: {result2.get('transitionCount', 'N/A')}")
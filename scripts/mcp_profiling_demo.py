@@ -11,20 +11,32 @@ to gather detailed parsing statistics:
 """
 
 import argparse
-import json
+import heapq
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import (
+    Decision,
+    McpSocketClient,
+    McpStdioClient,
+    ProfileResult,
+    ResultCache,
+    ValidateResult,
+    docker_exec_command,
+    from_result,
+)
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Grammar Profiling Demo")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
     p.add_argument("--jar-path", default="")
     p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
+    p.add_argument("--no-cache", action="store_true", help="Always ask the server instead of reusing cached results")
+    p.add_argument("--refresh", action="store_true", help="Recompute cached results and store the fresh ones")
+    p.add_argument("--socket", default="", help="Connect to a running mcp_daemon.py instead of starting a server")
     return p.parse_args()
 
 
@@ -121,11 +133,24 @@ return x + y + z;
 """
 
 
+def keep_largest(heap: list, k: int, key: float, index: int, item: Decision) -> None:
+    """Keep the k items with the largest keys seen so far; ties favour earlier items."""
+    entry = (key, -index, item)
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    else:
+        heapq.heappushpop(heap, entry)
+
+
 def main() -> int:
     args = parse_args()
     
-    if args.server == "docker":
+    if args.socket:
+        cmd = []  # the daemon already runs the server; never touch docker
+    elif args.server == "docker":
         cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
     else:
         repo_root = Path(args.repo_root).resolve()
         jar_path = args.jar_path.strip() or str(repo_root / "antlr4-mcp-server" / "target" / "antlr4-mcp-server-0.2.0.jar")
@@ -135,46 +160,73 @@ def main() -> int:
     print("  ANTLR4 Grammar Performance Profiling Demo")
     print("="*70)
 
-    client = McpStdioClient.start(cmd)
+    client = McpSocketClient.connect(args.socket) if args.socket else McpStdioClient.start(cmd)
+    if not args.no_cache:
+        # Each server (image, jar or daemon) keeps its own cached results
+        server = f"unix:{args.socket}" if args.socket else jar_path if args.server == "jar" else args.image
+        client.cache = ResultCache(refresh=args.refresh, server=server)
     
     try:
         client.initialize()
         print("✓ Connected to MCP server\n")
         
+        grammar = client.register_grammar(EXPR_GRAMMAR)
+
         # First validate the grammar
         print("--- Validating Grammar ---")
-        result = client.call_tool("validate_grammar", {
-            "grammar_text": EXPR_GRAMMAR
-        })
-        print(f"Grammar: {result.get('grammarName', 'ComplexExpr')}")
-        print(f"Valid: {result.get('success')}")
+        validation = client.call_tool("validate_grammar", client.grammar_args(grammar), ValidateResult)
+        print(f"Grammar: {validation.grammarName or 'ComplexExpr'}")
+        print(f"Valid: {validation.success}")
         
         # Profile the grammar
         print("\n" + "="*70)
         print("  PROFILING RESULTS")
         print("="*70)
         
-        result = client.call_tool("profile_grammar", {
-            "grammar_text": EXPR_GRAMMAR,
+        result, decisions = client.call_tool_items("profile_grammar", {
+            **client.grammar_args(grammar),
             "sample_input": SAMPLE_CODE,
             "start_rule": "program"
-        })
+        }, "decisions")
+
+        # Walk the decisions once, keeping only the rows printed below;
+        # result holds the remaining fields
+        decision_count = 0
+        by_time, by_dfa = [], []
+        ll_decisions, ll_count = [], 0
+        ambiguous, ambiguous_count = [], 0
+        for i, raw in enumerate(decisions):
+            dec = from_result(Decision, raw)
+            decision_count += 1
+            keep_largest(by_time, 5, dec.timeNanos, i, dec)
+            keep_largest(by_dfa, 5, dec.dfaStates, i, dec)
+            if dec.llFallback > 0:
+                ll_count += 1
+                if len(ll_decisions) < 5:
+                    ll_decisions.append(dec)
+            if dec.ambiguityCount > 0:
+                ambiguous_count += 1
+                if len(ambiguous) < 5:
+                    ambiguous.append(dec)
+        by_time = [dec for _, _, dec in heapq.nlargest(5, by_time)]
+        by_dfa = [dec for _, _, dec in heapq.nlargest(5, by_dfa)]
+        profile = from_result(ProfileResult, result)
         
-        print(f"\nSuccess: {result.get('success')}")
-        print(f"Grammar: {result.get('grammarName', 'N/A')}")
+        print(f"\nSuccess: {profile.success}")
+        print(f"Grammar: {profile.grammarName}")
         
         # Aggregate statistics
         print("\n--- Aggregate Statistics ---")
-        total_time_ms = result.get('totalTimeNanos', 0) / 1_000_000
+        total_time_ms = profile.totalTimeNanos / 1_000_000
         print(f"Total Parse Time:       {total_time_ms:.3f} ms")
-        print(f"Total SLL Lookahead:    {result.get('totalSLLLookahead', 0)}")
-        print(f"Total LL Lookahead:     {result.get('totalLLLookahead', 0)}")
-        print(f"Total ATN Transitions:  {result.get('totalATNTransitions', 0)}")
-        print(f"Total DFA States:       {result.get('totalDFAStates', 0)}")
+        print(f"Total SLL Lookahead:    {profile.totalSLLLookahead}")
+        print(f"Total LL Lookahead:     {profile.totalLLLookahead}")
+        print(f"Total ATN Transitions:  {profile.totalATNTransitions}")
+        print(f"Total DFA States:       {profile.totalDFAStates}")
         
         # SLL vs LL analysis
-        sll = result.get('totalSLLLookahead', 0)
-        ll = result.get('totalLLLookahead', 0)
+        sll = profile.totalSLLLookahead
+        ll = profile.totalLLLookahead
         if sll > 0 or ll > 0:
             sll_pct = (sll / (sll + ll)) * 100 if (sll + ll) > 0 else 0
             print(f"\nSLL Success Rate:       {sll_pct:.1f}%")
@@ -184,64 +236,45 @@ def main() -> int:
                 print("  ✓ All decisions resolved with SLL (fast path)")
         
         # Decision details
-        if result.get('decisions'):
-            decisions = result.get('decisions', [])
-            
-            print(f"\n--- Decision Analysis ({len(decisions)} decisions) ---")
+        if decision_count:
+            print(f"\n--- Decision Analysis ({decision_count} decisions) ---")
             
-            # Sort by time
-            by_time = sorted(decisions, key=lambda x: x.get('timeNanos', 0), reverse=True)
             print("\nTop 5 Slowest Decisions:")
             print(f"{'#':<4} {'Rule':<20} {'Time(ms)':<10} {'Invocations':<12} {'LL Fallback':<12}")
             print("-" * 60)
-            for dec in by_time[:5]:
-                dec_num = dec.get('decisionNumber', '?')
-                rule = dec.get('ruleName', 'unknown')
-                time_ms = dec.get('timeNanos', 0) / 1_000_000
-                invocations = dec.get('invocations', 0)
-                ll_fallback = dec.get('llFallback', 0)
-                print(f"{dec_num:<4} {rule:<20} {time_ms:<10.3f} {invocations:<12} {ll_fallback:<12}")
+            for dec in by_time:
+                dec_num = '?' if dec.decisionNumber is None else dec.decisionNumber
+                time_ms = dec.timeNanos / 1_000_000
+                print(f"{dec_num:<4} {dec.ruleName:<20} {time_ms:<10.3f} {dec.invocations:<12} {dec.llFallback:<12}")
             
-            # Find decisions with LL fallback
-            ll_decisions = [d for d in decisions if d.get('llFallback', 0) > 0]
+            # Decisions with LL fallback
             if ll_decisions:
-                print(f"\n⚠️  {len(ll_decisions)} decisions required LL fallback:")
-                for dec in ll_decisions[:5]:
-                    rule = dec.get('ruleName', 'unknown')
-                    ll_fallback = dec.get('llFallback', 0)
-                    ll_max = dec.get('llMaxLook', 0)
-                    print(f"    {rule}: {ll_fallback} fallbacks, max lookahead: {ll_max}")
+                print(f"\n⚠️  {ll_count} decisions required LL fallback:")
+                for dec in ll_decisions:
+                    print(f"    {dec.ruleName}: {dec.llFallback} fallbacks, max lookahead: {dec.llMaxLook}")
             
-            # Find ambiguous decisions
-            ambiguous = [d for d in decisions if d.get('ambiguityCount', 0) > 0]
+            # Ambiguous decisions
             if ambiguous:
-                print(f"\n⚠️  {len(ambiguous)} decisions had ambiguities:")
-                for dec in ambiguous[:5]:
-                    rule = dec.get('ruleName', 'unknown')
-                    amb_count = dec.get('ambiguityCount', 0)
-                    print(f"    {rule}: {amb_count} ambiguities")
+                print(f"\n⚠️  {ambiguous_count} decisions had ambiguities:")
+                for dec in ambiguous:
+                    print(f"    {dec.ruleName}: {dec.ambiguityCount} ambiguities")
             
             # DFA state analysis
             print("\n--- DFA State Usage ---")
-            by_dfa = sorted(decisions, key=lambda x: x.get('dfaStates', 0), reverse=True)
             print(f"{'Rule':<25} {'DFA States':<12} {'SLL Trans':<12} {'LL Trans':<12}")
             print("-" * 65)
-            for dec in by_dfa[:5]:
-                rule = dec.get('ruleName', 'unknown')
-                dfa_states = dec.get('dfaStates', 0)
-                sll_trans = dec.get('sllDFATransitions', 0)
-                ll_trans = dec.get('llDFATransitions', 0)
-                print(f"{rule:<25} {dfa_states:<12} {sll_trans:<12} {ll_trans:<12}")
+            for dec in by_dfa:
+                print(f"{dec.ruleName:<25} {dec.dfaStates:<12} {dec.sllDFATransitions:<12} {dec.llDFATransitions:<12}")
         
         # Insights and hints
-        if result.get('insights'):
+        if profile.insights:
             print("\n--- Insights ---")
-            for insight in result.get('insights', []):
+            for insight in profile.insights:
                 print(f"  • {insight}")
         
-        if result.get('optimizationHints'):
+        if profile.optimizationHints:
             print("\n--- Optimization Hints ---")
-            for hint in result.get('optimizationHints', []):
+            for hint in profile.optimizationHints:
                 print(f"  💡 {hint}")
         
         # Summary
@@ -252,7 +285,7 @@ def main() -> int:
 Key Metrics:
   • Parse Time: {total_time_ms:.3f} ms for {len(SAMPLE_CODE)} bytes of input
   • SLL/LL Ratio: {sll}/{ll} (higher SLL = faster parsing)
-  • DFA States: {result.get('totalDFAStates', 0)} (cached for reuse)
+  • DFA States: {profile.totalDFAStates} (cached for reuse)
 
 What to look for:
   1. High LL Fallback: Indicates grammar needs more lookahead
@@ -15,13 +15,13 @@ from pathlib import Path
 
 # Add parent directory to path to import mcp_client
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import McpSocketClient, McpStdioClient, docker_exec_command, read_source, write_generated_files
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Route DSL demo using ANTLR4 MCP server")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker",
-                   help="Server mode: docker or jar")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker",
+                   help="Server mode: docker, docker-exec or jar")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest",
                    help="Docker image to run (for --server docker)")
     p.add_argument("--jar-path", default="",
@@ -30,6 +30,7 @@ def parse_args() -> argparse.Namespace:
                    help="Directory to write generated sources (default: dsl-starter/generated/python)")
     p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]),
                    help="Repository root path")
+    p.add_argument("--socket", default="", help="Connect to a running mcp_daemon.py instead of starting a server")
     return p.parse_args()
 
 
@@ -51,12 +52,16 @@ def main() -> int:
     print(f"Output:  {out_dir}")
     print()
 
-    grammar_text = grammar_path.read_text(encoding="utf-8")
-    sample_input = sample_path.read_text(encoding="utf-8")
+    grammar_text = read_source(grammar_path)
+    sample_input = read_source(sample_path)
 
     # Build command based on server mode
-    if args.server == "docker":
+    if args.socket:
+        cmd = []  # the daemon already runs the server; never touch docker
+    elif args.server == "docker":
         cmd = ["docker", "run", "-i", "--rm", args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
     elif args.server == "jar":
         jar_path = args.jar_path.strip()
         if not jar_path:
@@ -65,23 +70,33 @@ def main() -> int:
     else:
         raise RuntimeError(f"Unsupported server mode: {args.server}")
 
-    print(f"Starting MCP server: {' '.join(cmd)}")
-    client = McpStdioClient.start(cmd)
+    if args.socket:
+        print(f"Connecting to MCP daemon: {args.socket}")
+        client = McpSocketClient.connect(args.socket)
+    else:
+        print(f"Starting MCP server: {' '.join(cmd)}")
+        client = McpStdioClient.start(cmd)
     
     try:
         client.initialize()
 
-        tools = client.request("tools/list")
-        if "error" in tools:
-            raise RuntimeError(f"tools/list failed: {tools['error']}")
+        client.list_tools()
         print(f"[ok] Connected to MCP server")
 
+        # Escape the grammar once; each call below splices it in as-is
+        grammar = client.register_grammar(grammar_text)
+
+        # Validation and parsing are independent, so pipeline them
+        validation, parsed = client.call_tools([
+            ("validate_grammar", {**client.grammar_args(grammar), "grammar_name": "RouteDsl"}),
+            (
+                "parse_sample",
+                {**client.grammar_args(grammar), "sample_input": sample_input, "start_rule": "file", "show_tokens": False},
+            ),
+        ])
+
         # Step 1: Validate grammar
         print("\n--- Step 1: Validate Grammar ---")
-        validation = client.call_tool(
-            "validate_grammar",
-            {"grammar_text": grammar_text, "grammar_name": "RouteDsl"},
-        )
         print(f"[ok] validate_grammar success={validation.get('success')} grammarName={validation.get('grammarName')}")
         if not validation.get("success", False):
             print(json.dumps(validation, indent=2))
@@ -89,10 +104,6 @@ def main() -> int:
 
         # Step 2: Parse sample input
         print("\n--- Step 2: Parse Sample Input ---")
-        parsed = client.call_tool(
-            "parse_sample",
-            {"grammar_text": grammar_text, "sample_input": sample_input, "start_rule": "file", "show_tokens": False},
-        )
         print(f"[ok] parse_sample success={parsed.get('success')}")
         if not parsed.get("success", False):
             print(json.dumps(parsed, indent=2))
@@ -103,7 +114,7 @@ def main() -> int:
         compiled = client.call_tool(
             "compile_grammar_multi_target",
             {
-                "grammar_text": grammar_text,
+                **client.grammar_args(grammar),
                 "target_language": "python",
                 "generate_listener": True,
                 "generate_visitor": True,
@@ -116,21 +127,11 @@ def main() -> int:
             return 1
 
         # Write generated files
-        files = compiled.get("files") or []
-        out_dir.mkdir(parents=True, exist_ok=True)
-        wrote = 0
-        for f in files:
-            file_name = f.get("fileName")
-            content = f.get("content")
-            if not file_name or content is None:
-                continue
-            dest = out_dir / file_name
-            dest.parent.mkdir(parents=True, exist_ok=True)
-            dest.write_text(content, encoding="utf-8")
-            wrote += 1
+        written = write_generated_files(out_dir, compiled.get("files") or [])
+        for file_name in written:
             print(f"  - {file_name}")
 
-        print(f"\n[ok] Wrote {wrote} generated files to: {out_dir}")
+        print(f"\n[ok] Wrote {len(written)} generated files to: {out_dir}")
         print("\n=== Next Steps ===")
         print("1. Install runtime: pip install antlr4-python3-runtime")
         print(f"2. Use the generated parser files in: {out_dir}")
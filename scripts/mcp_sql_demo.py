@@ -7,98 +7,282 @@ Demonstrates parsing SQL-like queries and generating a parser.
 
 import argparse
 import json
+import os
+import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Optional
 
 sys.path.insert(0, str(Path(__file__).parent))
-from mcp_client import McpStdioClient
+from mcp_client import (
+    McpSocketClient,
+    McpStdioClient,
+    ResultCache,
+    docker_exec_command,
+    format_json,
+    read_source,
+    write_generated,
+    write_generated_files,
+)
 
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="SQL Subset demo")
-    p.add_argument("--server", choices=["docker", "jar"], default="docker")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
     p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
     p.add_argument("--out-dir", default="")
-    p.add_argument("--target", default="python")
+    p.add_argument("--target", default="python",
+                   help="Target language, or a comma-separated list compiled in parallel")
     p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
-    return p.parse_args()
+    p.add_argument("--socket", default="", help="Connect to a running mcp_daemon.py instead of starting a server")
+    p.add_argument("--no-cache", action="store_true", help="Always ask the server instead of reusing cached results")
+    p.add_argument("--refresh", action="store_true", help="Recompute cached results and store the fresh ones")
+    p.add_argument("--skip-validate", action="store_true",
+                   help="Skip validate_grammar; grammar errors surface from the parse and compile steps")
+    args = p.parse_args()
+    args.targets = [t.strip() for t in args.target.split(",") if t.strip()]
+    if not args.targets:
+        p.error("--target needs at least one target language")
+    return args
+
+
+def start_client(args: argparse.Namespace, mounts: dict[str, Path]) -> McpStdioClient:
+    if args.socket:
+        return McpSocketClient.connect(args.socket)
+    if args.server == "docker":
+        # Bind-mount each target's output directory so the server can write generated files itself
+        volumes = []
+        for target, out_dir in mounts.items():
+            out_dir.mkdir(parents=True, exist_ok=True)
+            volumes += ["-v", f"{out_dir}:/out/{target}"]
+        if volumes:
+            # Files the server writes stay owned by the caller, so local writes can replace them
+            volumes += ["--user", f"{os.getuid()}:{os.getgid()}"]
+        cmd = ["docker", "run", "-i", "--rm", *volumes, args.image]
+    elif args.server == "docker-exec":
+        cmd = docker_exec_command(args.image)
+    else:
+        raise RuntimeError("Only docker mode supported")
+    return McpStdioClient.start(cmd)
+
+
+def warm_image(image: str) -> Optional["subprocess.Popen[bytes]"]:
+    """Have the Docker daemon resolve the image in the background; None if docker is unavailable."""
+    try:
+        return subprocess.Popen(["docker", "image", "inspect", image], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+
+
+def local_parse(out_dir: Path, grammar_path: Path, sample_input: str) -> Optional[str]:
+    """
+    Parse the sample in process with a previously generated Python parser.
+
+    Returns the parse tree, or None when antlr4-python3-runtime is missing,
+    out_dir holds no parser newer than the grammar, the parser does not load
+    or run (e.g. it was generated for another runtime version), or the sample
+    has syntax errors (the server then reports them).
+    """
+    try:
+        if (out_dir / "SqlSubsetParser.py").stat().st_mtime < grammar_path.stat().st_mtime:
+            return None
+    except FileNotFoundError:
+        return None
+
+    sys.path.insert(0, str(out_dir))
+    try:
+        # Imported only here, so runs that never parse locally skip the runtime import
+        import antlr4
+        from SqlSubsetLexer import SqlSubsetLexer
+        from SqlSubsetParser import SqlSubsetParser
+
+        parser = SqlSubsetParser(antlr4.CommonTokenStream(SqlSubsetLexer(antlr4.InputStream(sample_input))))
+        parser.removeErrorListeners()
+        tree = parser.sql_stmt_list()
+        if parser.getNumberOfSyntaxErrors():
+            return None
+        return tree.toStringTree(recog=parser)
+    except Exception:
+        return None
+    finally:
+        sys.path.remove(str(out_dir))
 
 
 def main() -> int:
     args = parse_args()
+    # Resolve the image while the cache is consulted; a fully cached run stops it unused
+    warm = warm_image(args.image) if args.server == "docker" and not args.socket else None
     repo_root = Path(args.repo_root).resolve()
 
     grammar_path = repo_root / "dsl-starter" / "grammar" / "SqlSubset.g4"
     sample_path = repo_root / "dsl-starter" / "samples" / "queries.sql"
 
-    if args.out_dir.strip():
-        out_dir = Path(args.out_dir).expanduser().resolve()
+    targets = args.targets
+    if not args.out_dir.strip():
+        out_dirs = {t: repo_root / "dsl-starter" / "generated" / t for t in targets}
+    elif len(targets) == 1:
+        out_dirs = {targets[0]: Path(args.out_dir).expanduser().resolve()}
     else:
-        out_dir = repo_root / "dsl-starter" / "generated" / args.target
+        out_dirs = {t: Path(args.out_dir).expanduser().resolve() / t for t in targets}
 
-    grammar_text = grammar_path.read_text(encoding="utf-8")
-    sample_input = (
-        sample_path.read_text(encoding="utf-8")
-        if sample_path.exists()
-        else "SELECT name, email FROM users WHERE age > 25"
+    grammar_text = read_source(grammar_path)
+    sample_input = read_source(
+        sample_path,
+        default="SELECT name, email FROM users WHERE age > 25",
     )
 
-    if args.server == "docker":
-        cmd = ["docker", "run", "-i", "--rm", args.image]
-    else:
-        raise RuntimeError("Only docker mode supported")
+    server = f"unix:{args.socket}" if args.socket else args.image
+    cache = None if args.no_cache else ResultCache(refresh=args.refresh, server=server)
+    client: Optional[McpStdioClient] = None
+    # Grammar arguments shared by every call: the text for cache keys, whatever
+    # register_grammar settled on for the server
+    text_args = {"grammar_text": grammar_text}
+    grammar_args: dict[str, Any] = {}
+    connect_lock = threading.Lock()
+
+    mounts = out_dirs if args.server == "docker" and not args.socket else {}
+
+    def cached(name: str, arguments: dict[str, Any]) -> Optional[dict[str, Any]]:
+        return cache.lookup(name, {**text_args, **arguments}) if cache is not None else None
+
+    def connect() -> McpStdioClient:
+        # The server is only started once a result is missing from the cache
+        nonlocal client, grammar_args
+        with connect_lock:
+            if client is None:
+                if warm is not None:
+                    warm.wait()
+                client = start_client(args, mounts)
+                client.cache = cache
+                client.initialize()
+                grammar_args = client.grammar_args(client.register_grammar(grammar_text))
+            return client
+
+    def call_tools(calls: list[tuple[str, dict[str, Any]]]) -> list[dict[str, Any]]:
+        """
+        Call grammar tools, registering the grammar once the server is needed.
+
+        The calls are pipelined: all requests are written before any response
+        is awaited, and the reader thread matches the answers up by id.
+        """
+        hits = [r for name, arguments in calls if (r := cached(name, arguments)) is not None]
+        if len(hits) == len(calls):
+            return hits
+        c = connect()
+        futures = [c.call_tool_async(name, {**grammar_args, **arguments}) for name, arguments in calls]
+        return [fut.result() for fut in futures]
+
+    def compile_target(target: str) -> tuple[dict[str, Any], str]:
+        """Compile one target; returns the result and a line reporting where its files went."""
+        out_dir = out_dirs[target]
+        compile_args = {
+            "target_language": target,
+            "generate_listener": True,
+            "generate_visitor": True,
+            "include_generated_code": True,
+        }
+        # Server-written compiles bypass the result cache; a stamp of their arguments
+        # and files in out_dir lets a re-run skip them while the files are still there
+        stamp = out_dir / ".mcp-compile"
+        stamp_key = ResultCache.key("compile_grammar_multi_target", {**text_args, **compile_args, "image": args.image})
+        if target in mounts and cache is not None and not cache.refresh:
+            try:
+                recorded = json.loads(stamp.read_text(encoding="utf-8"))
+                if recorded["key"] == stamp_key and all((out_dir / name).is_file() for name in recorded["files"]):
+                    return {"success": True}, f"[ok] Generated {target} files in {out_dir} are up to date"
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+        server_writes = (
+            target in mounts
+            and cached("compile_grammar_multi_target", compile_args) is None
+            and connect().accepts_argument("compile_grammar_multi_target", "output_dir")
+        )
+        if server_writes:
+            # Generated sources land in the mounted out_dir instead of crossing the pipe as JSON
+            compile_args.update(output_dir=f"/out/{target}", include_generated_code=False)
+            [compiled] = call_tools([("compile_grammar_multi_target", compile_args)])
+            if compiled.get("success") and cache is not None:
+                files = [f.relative_to(out_dir).as_posix() for f in out_dir.rglob("*") if f.is_file() and f != stamp]
+                if files:
+                    stamp.write_text(json.dumps({"key": stamp_key, "files": sorted(files)}), encoding="utf-8")
+            return compiled, f"[ok] Server wrote generated {target} files to {out_dir}"
+
+        if (compiled := cached("compile_grammar_multi_target", compile_args)) is not None:
+            written = write_generated_files(out_dir, compiled.get("files") or [])
+            return compiled, f"[ok] Generated {len(written)} {target} files to {out_dir}"
+
+        # Write each generated file as soon as the server sends it
+        written: list[str] = []
+
+        def write_file(f: dict[str, Any]) -> None:
+            file_name = write_generated(out_dir, f)
+            if file_name:
+                written.append(file_name)
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        compiled = connect().call_tool_stream(
+            "compile_grammar_multi_target", {**grammar_args, **compile_args}, write_file
+        )
+        return compiled, f"[ok] Generated {len(written)} {target} files to {out_dir}"
 
-    client = McpStdioClient.start(cmd)
     try:
-        client.initialize()
+        # A parser generated by an earlier run can parse the sample without a round-trip
+        local_tree = local_parse(out_dirs["python"], grammar_path, sample_input) if "python" in out_dirs else None
+        calls: list[tuple[str, dict[str, Any]]] = []
+        if not args.skip_validate:
+            calls.append(("validate_grammar", {"grammar_name": "SqlSubset"}))
+        if local_tree is None:
+            calls.append(
+                ("parse_sample", {"sample_input": sample_input, "start_rule": "sql_stmt_list", "show_tokens": False})
+            )
+        # Validation and parsing are independent, so both requests are in flight together
+        results = call_tools(calls) if calls else []
 
         print("[1/3] Validating SQL grammar...")
-        validation = client.call_tool("validate_grammar", {"grammar_text": grammar_text, "grammar_name": "SqlSubset"})
-        if not validation.get("success"):
-            print(json.dumps(validation, indent=2))
-            return 1
-        print("[ok] Grammar is valid")
+        if args.skip_validate:
+            # Parsing and compiling load the grammar too and report the same errors
+            print("[skip] Validation left to the parse and compile steps")
+        else:
+            validation = results.pop(0)
+            if not validation.get("success"):
+                print(format_json(validation))
+                return 1
+            print("[ok] Grammar is valid")
+        parsed = results.pop() if local_tree is None else {"success": True, "parseTree": local_tree}
 
         print("\n[2/3] Parsing SQL query...")
-        parsed = client.call_tool(
-            "parse_sample",
-            {"grammar_text": grammar_text, "sample_input": sample_input, "start_rule": "sql_stmt_list", "show_tokens": False},
-        )
         if parsed.get("success"):
-            print(f"[ok] SQL parsed successfully")
+            print(f"[ok] SQL parsed successfully{' (in process)' if local_tree is not None else ''}")
             print(f"Parse tree: {parsed.get('parseTree', '')[:300]}...")
         else:
             print(f"[error] Parse failed")
+            if args.skip_validate:
+                print(format_json(parsed))
             return 1
 
-        print(f"\n[3/3] Generating {args.target} parser...")
-        compiled = client.call_tool(
-            "compile_grammar_multi_target",
-            {
-                "grammar_text": grammar_text,
-                "target_language": args.target,
-                "generate_listener": True,
-                "generate_visitor": True,
-                "include_generated_code": True,
-            },
-        )
-        if not compiled.get("success"):
-            print(json.dumps(compiled, indent=2))
-            return 1
+        print(f"\n[3/3] Generating {', '.join(targets)} parser{'s' if len(targets) > 1 else ''}...")
+        # Compiles for different targets are independent; the client multiplexes them by request id
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            results = list(pool.map(compile_target, targets))
 
-        files = compiled.get("files") or []
-        out_dir.mkdir(parents=True, exist_ok=True)
-        for f in files:
-            file_name = f.get("fileName")
-            content = f.get("content")
-            if file_name and content is not None:
-                (out_dir / file_name).parent.mkdir(parents=True, exist_ok=True)
-                (out_dir / file_name).write_text(content, encoding="utf-8")
-
-        print(f"[ok] Generated {len(files)} files to {out_dir}")
-        return 0
+        status = 0
+        for compiled, report in results:
+            if not compiled.get("success"):
+                print(format_json(compiled))
+                status = 1
+            else:
+                print(report)
+        return status
     finally:
-        client.close()
+        if client is not None:
+            client.close()
+        if warm is not None and warm.poll() is None:
+            # Only reached without a server start, which would have waited for it
+            warm.terminate()
+            warm.wait()
 
 
 if __name__ == "__main__":
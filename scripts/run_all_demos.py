@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Run the demo scripts back to back against one shared MCP server.
+
+Each demo normally starts its own server and pays the Docker/JVM cold start.
+Here every demo's McpStdioClient.start() is routed through McpServerHandle,
+so demos using the same command share one warm server process.
+
+    python run_all_demos.py
+    python run_all_demos.py mcp_route_dsl_demo mcp_profiling_demo
+"""
+
+import argparse
+import importlib
+import sys
+import traceback
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from mcp_client import McpServerHandle, McpStdioClient
+
+DEMOS = [
+    "mcp_route_dsl_demo",
+    "mcp_api_schema_demo",
+    "mcp_calculator_demo",
+    "mcp_sql_demo",
+    "mcp_json_demo",
+    "mcp_config_demo",
+    "mcp_grammar_analysis_demo",
+    "mcp_profiling_demo",
+    "mcp_all_tools_demo",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Run the demos against one shared MCP server")
+    p.add_argument("demos", nargs="*", help=f"Demos to run (default: all of {', '.join(DEMOS)})")
+    p.add_argument("--server", choices=["docker", "docker-exec", "jar"], default="docker")
+    p.add_argument("--image", default="sshailabh1/antlr4-mcp-server:latest")
+    p.add_argument("--repo-root", default=str(Path(__file__).resolve().parents[2]))
+    args = p.parse_args()
+    unknown = [d for d in args.demos if d not in DEMOS]
+    if unknown:
+        p.error(f"unknown demos: {', '.join(unknown)}")
+    args.demos = args.demos or DEMOS
+    return args
+
+
+def main() -> int:
+    args = parse_args()
+    demo_argv = ["--server", args.server, "--image", args.image, "--repo-root", args.repo_root]
+
+    McpStdioClient.start = McpServerHandle.get_or_start
+    failed = []
+    try:
+        for name in args.demos:
+            print(f"\n##### {name} #####\n", flush=True)
+            sys.argv = [f"{name}.py", *demo_argv]
+            try:
+                code = importlib.import_module(name).main()
+            except SystemExit as e:
+                code = e.code
+            except Exception:
+                # One broken demo should not stop the rest of the run
+                traceback.print_exc()
+                code = 1
+            if code:
+                failed.append(name)
+    finally:
+        McpServerHandle.close_all()
+
+    print(f"\n{len(args.demos) - len(failed)}/{len(args.demos)} demos passed")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())